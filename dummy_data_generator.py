@@ -4,62 +4,179 @@ Dummy Data Generator for Scones Unlimited ML Workflow
 Simulates continuous stream of delivery vehicle images for testing
 """
 
+import gzip
 import json
+import os
+import tempfile
 import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError
 import random
+import threading
 import time
 from datetime import datetime
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import argparse
+import asyncio
+
+# botocore's default urllib3 pool only holds 10 connections
+DEFAULT_MAX_POOL_CONNECTIONS = 50
+
+# StartSyncExecution holds the connection open for the whole Express run,
+# which is capped at 5 minutes; botocore's 60s default would cut it short
+SYNC_EXECUTION_READ_TIMEOUT = 330
+
+TERMINAL_STATUSES = ('SUCCEEDED', 'FAILED', 'TIMED_OUT', 'ABORTED')
+
+# Seconds between sweeps of the shared execution poller, and the longest it
+# backs off to while the API is throttling it
+EXECUTION_POLL_INTERVAL = 1.0
+EXECUTION_POLL_MAX_BACKOFF = 8
+
+# Up to this many pending executions are polled with describe_execution,
+# which has a far larger throttle bucket than list_executions and returns
+# the output/error details too; above it one list_executions sweep is cheaper
+DESCRIBE_POLL_MAX_PENDING = 3
 
 class DummyDataGenerator:
-    def __init__(self, bucket_name, step_function_arn):
+    def __init__(self, bucket_name, step_function_arn, max_pool_connections=DEFAULT_MAX_POOL_CONNECTIONS,
+                 manifest_key=None):
         """
         Initialize the dummy data generator
         
         Args:
             bucket_name (str): S3 bucket containing test images
             step_function_arn (str): ARN of the Step Function to invoke
+            max_pool_connections (int): Size of the shared HTTP connection pool
+            manifest_key (str): Optional key of a gzip manifest listing the test image keys
         """
         self.bucket_name = bucket_name
         self.step_function_arn = step_function_arn
-        self.s3_client = boto3.client('s3')
-        self.stepfunctions_client = boto3.client('stepfunctions')
+        self.manifest_key = manifest_key
+        # Prebuilt Step Function input; test cases are shallow copies of it
+        self._test_case_template = {
+            "image_data": "",
+            "s3_bucket": bucket_name,
+            "s3_key": None
+        }
+        # One session resolves credentials/region once and is shared by every client;
+        # the region defaults to the one in the state machine ARN
+        self._session = boto3.session.Session(
+            region_name=os.environ.get('AWS_REGION', step_function_arn.split(':')[3])
+        )
+        self._create_clients(max_pool_connections)
         self.test_images = self._get_test_images()
+        self._num_test_images = len(self.test_images)
+        self.state_machine_type = self._get_state_machine_type()
+        # Executions waiting on the shared poller thread: ARN -> wait entry
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._poller = None
+    
+    def _create_clients(self, max_pool_connections):
+        """Create the AWS clients shared by all worker threads"""
+        config = Config(
+            max_pool_connections=max_pool_connections,
+            retries={'max_attempts': 10, 'mode': 'adaptive'}
+        )
+        self.max_pool_connections = max_pool_connections
+        self.s3_client = self._session.client('s3', config=config)
+        self.stepfunctions_client = self._session.client('stepfunctions', config=config)
+        # StartSyncExecution is not idempotent, so a retry would run the
+        # workflow again; it gets its own client that never retries
+        self.sync_stepfunctions_client = self._session.client('stepfunctions', config=Config(
+            max_pool_connections=max_pool_connections,
+            retries={'total_max_attempts': 1},
+            read_timeout=SYNC_EXECUTION_READ_TIMEOUT
+        ))
         
     def _get_test_images(self):
-        """Get list of test images from S3 bucket"""
+        """Get all test image keys from S3 bucket (across every page of results)"""
+        if self.manifest_key:
+            return self._get_test_images_from_manifest()
+        
         try:
-            response = self.s3_client.list_objects_v2(
+            paginator = self.s3_client.get_paginator('list_objects_v2')
+            pages = paginator.paginate(
                 Bucket=self.bucket_name,
-                Prefix="test/"
+                Prefix="test/",
+                PaginationConfig={'PageSize': 1000}
             )
             
-            if 'Contents' in response:
-                images = [obj['Key'] for obj in response['Contents'] 
-                         if obj['Key'].endswith('.png')]
+            images = tuple(obj['Key'] for page in pages
+                           for obj in page.get('Contents', [])
+                           if obj['Key'].endswith('.png'))
+            
+            if images:
                 print(f"Found {len(images)} test images")
-                return images
             else:
                 print("No test images found in bucket")
-                return []
+            return images
                 
         except Exception as e:
             print(f"Error listing test images: {e}")
-            return []
+            return ()
+    
+    def _get_test_images_from_manifest(self):
+        """
+        Get test image keys from a gzip manifest (one key per line) in one request
+        
+        The decompressed manifest is cached in the temp directory under its
+        ETag, so later runs only need a HeadObject call while it is unchanged.
+        """
+        try:
+            head = self.s3_client.head_object(Bucket=self.bucket_name, Key=self.manifest_key)
+            etag = head['ETag'].strip('"')
+            cache_file = os.path.join(tempfile.gettempdir(), f"test-images-manifest-{etag}.txt")
+            
+            if os.path.exists(cache_file):
+                with open(cache_file, 'r') as f:
+                    lines = f.read().splitlines()
+            else:
+                obj = self.s3_client.get_object(Bucket=self.bucket_name, Key=self.manifest_key)
+                content = gzip.decompress(obj['Body'].read()).decode('utf-8')
+                with open(cache_file, 'w') as f:
+                    f.write(content)
+                lines = content.splitlines()
+            
+            images = tuple(key for key in lines if key.endswith('.png'))
+            print(f"Found {len(images)} test images in manifest {self.manifest_key}")
+            return images
+            
+        except Exception as e:
+            print(f"Error reading test image manifest: {e}")
+            return ()
+    
+    def _get_state_machine_type(self):
+        """Get the workflow type (STANDARD or EXPRESS) of the Step Function"""
+        try:
+            response = self.stepfunctions_client.describe_state_machine(
+                stateMachineArn=self.step_function_arn
+            )
+            return response.get('type', 'STANDARD')
+            
+        except Exception as e:
+            print(f"Error describing state machine, assuming STANDARD: {e}")
+            return 'STANDARD'
     
     def generate_test_case(self):
         """Generate a single test case for Step Function execution"""
         if not self.test_images:
             raise ValueError("No test images available")
             
-        image_key = random.choice(self.test_images)
+        image_key = self.test_images[random.randrange(self._num_test_images)]
         
-        return {
-            "image_data": "",
-            "s3_bucket": self.bucket_name,
-            "s3_key": image_key
-        }
+        return {**self._test_case_template, "s3_key": image_key}
+    
+    def generate_test_cases(self, count):
+        """Generate count test cases, sampling all image keys in one call"""
+        if not self.test_images:
+            raise ValueError("No test images available")
+        
+        image_keys = random.choices(self.test_images, k=count)
+        
+        template = self._test_case_template
+        return [{**template, "s3_key": image_key} for image_key in image_keys]
     
     def execute_step_function(self, test_input, execution_name=None):
         """
@@ -79,6 +196,19 @@ class DummyDataGenerator:
         start_time = time.time()
         
         try:
+            # Express workflows can run synchronously, so no polling is needed
+            if self.state_machine_type == 'EXPRESS':
+                status_response = self.sync_stepfunctions_client.start_sync_execution(
+                    stateMachineArn=self.step_function_arn,
+                    name=execution_name,
+                    input=json.dumps(test_input)
+                )
+                
+                return self._execution_result(
+                    execution_name, status_response['executionArn'], test_input, status_response, start_time
+                )
+            
+            # Standard workflows are started asynchronously and polled
             response = self.stepfunctions_client.start_execution(
                 stateMachineArn=self.step_function_arn,
                 name=execution_name,
@@ -87,40 +217,26 @@ class DummyDataGenerator:
             
             execution_arn = response['executionArn']
             
-            # Wait for execution to complete (with timeout)
+            # Wait for the shared poller to see the execution finish (with timeout)
             max_wait_time = 60  # seconds
-            wait_start = time.time()
+            status, status_response = self._wait_for_execution(execution_arn, start_time, max_wait_time)
             
-            while time.time() - wait_start < max_wait_time:
-                status_response = self.stepfunctions_client.describe_execution(
-                    executionArn=execution_arn
+            # list_executions does not include output or error details, so fetch
+            # them with a single describe call unless the poller already did;
+            # timed out and aborted executions have neither, and their status
+            # is already known
+            if status_response is None:
+                if status in ('TIMED_OUT', 'ABORTED'):
+                    status_response = {'status': status}
+                else:
+                    status_response = self.stepfunctions_client.describe_execution(
+                        executionArn=execution_arn
+                    )
+            
+            if status_response['status'] in TERMINAL_STATUSES:
+                return self._execution_result(
+                    execution_name, execution_arn, test_input, status_response, start_time
                 )
-                
-                status = status_response['status']
-                
-                if status in ['SUCCEEDED', 'FAILED', 'TIMED_OUT', 'ABORTED']:
-                    end_time = time.time()
-                    duration = end_time - start_time
-                    
-                    result = {
-                        'execution_name': execution_name,
-                        'execution_arn': execution_arn,
-                        'status': status,
-                        'duration': duration,
-                        'input': test_input,
-                        'start_time': start_time,
-                        'end_time': end_time
-                    }
-                    
-                    if status == 'SUCCEEDED':
-                        result['output'] = status_response.get('output')
-                    elif status == 'FAILED':
-                        result['error'] = status_response.get('error', 'Unknown error')
-                        result['cause'] = status_response.get('cause', 'Unknown cause')
-                    
-                    return result
-                
-                time.sleep(1)  # Wait 1 second before checking again
             
             # Timeout case
             return {
@@ -141,6 +257,155 @@ class DummyDataGenerator:
                 'error': str(e)
             }
     
+    def _execution_result(self, execution_name, execution_arn, test_input, status_response, start_time):
+        """
+        Build the result record for an execution that reached a terminal status
+        
+        Shared by the Express, Standard and async paths so a given outcome is
+        reported the same way in every mode: succeeded executions carry their
+        output, every other terminal status carries error and cause.
+        
+        Args:
+            execution_name (str): Name of the execution
+            execution_arn (str): ARN of the execution
+            test_input (dict): Input the execution was started with
+            status_response (dict): Execution description with at least 'status'
+            start_time (float): Time the execution was started
+            
+        Returns:
+            dict: Execution result with status and timing
+        """
+        end_time = time.time()
+        status = status_response['status']
+        
+        result = {
+            'execution_name': execution_name,
+            'execution_arn': execution_arn,
+            'status': status,
+            'duration': end_time - start_time,
+            'input': test_input,
+            'start_time': start_time,
+            'end_time': end_time
+        }
+        
+        if status == 'SUCCEEDED':
+            result['output'] = status_response.get('output')
+        else:
+            result['error'] = status_response.get('error', 'Unknown error')
+            result['cause'] = status_response.get('cause', 'Unknown cause')
+        
+        return result
+    
+    def _wait_for_execution(self, execution_arn, start_time, timeout):
+        """
+        Block until the shared poller sees the execution reach a terminal status
+        
+        Args:
+            execution_arn (str): ARN of the started execution
+            start_time (float): Time the execution was started
+            timeout (float): Maximum time to wait in seconds
+            
+        Returns:
+            tuple: (terminal status, describe_execution response if the poller
+                fetched one), or (None, None) if the wait timed out
+        """
+        entry = {'event': threading.Event(), 'start_time': start_time, 'status': None, 'response': None}
+        
+        with self._pending_lock:
+            self._pending[execution_arn] = entry
+            if self._poller is None:
+                self._poller = threading.Thread(target=self._poll_executions, daemon=True)
+                self._poller.start()
+        
+        entry['event'].wait(timeout)
+        
+        with self._pending_lock:
+            self._pending.pop(execution_arn, None)
+        
+        return entry['status'], entry['response']
+    
+    def _resolve_pending(self, execution_arn, status, response=None):
+        """Hand a terminal status to the thread waiting on the execution"""
+        with self._pending_lock:
+            entry = self._pending.get(execution_arn)
+            if entry is not None:
+                entry['status'] = status
+                entry['response'] = response
+                entry['event'].set()
+    
+    def _poll_executions(self):
+        """
+        Resolve every pending execution once per interval
+        
+        Replaces one describe_execution loop per worker thread, so API traffic
+        no longer grows with the number of in-flight executions. A handful of
+        pending executions are described individually; more than that are
+        resolved from one list_executions sweep. Throttling backs the sweep
+        interval off.
+        """
+        paginator = self.stepfunctions_client.get_paginator('list_executions')
+        delay = EXECUTION_POLL_INTERVAL
+        
+        while True:
+            time.sleep(delay)
+            
+            with self._pending_lock:
+                if not self._pending:
+                    self._poller = None
+                    return
+                unresolved = set(self._pending)
+                # Allow some clock skew between this machine and the service
+                oldest_start = min(e['start_time'] for e in self._pending.values()) - 60
+            
+            try:
+                if len(unresolved) <= DESCRIBE_POLL_MAX_PENDING:
+                    for execution_arn in unresolved:
+                        response = self.stepfunctions_client.describe_execution(
+                            executionArn=execution_arn
+                        )
+                        if response['status'] in TERMINAL_STATUSES:
+                            self._resolve_pending(execution_arn, response['status'], response)
+                else:
+                    self._sweep_executions(paginator, unresolved, oldest_start)
+                
+                delay = EXECUTION_POLL_INTERVAL
+                
+            except ClientError as e:
+                if e.response['Error']['Code'] == 'ThrottlingException':
+                    delay = min(delay * 2, EXECUTION_POLL_MAX_BACKOFF)
+                else:
+                    print(f"Error polling executions: {e}")
+            except Exception as e:
+                print(f"Error polling executions: {e}")
+    
+    def _sweep_executions(self, paginator, unresolved, oldest_start):
+        """
+        Resolve pending executions from one newest-first list_executions pass
+        
+        Every status comes back in the same listing, so one pass covers all
+        terminal statuses. Paging stops once every pending execution is
+        resolved or the listing is past the oldest one.
+        """
+        pages = paginator.paginate(
+            stateMachineArn=self.step_function_arn,
+            PaginationConfig={'PageSize': 1000}
+        )
+        
+        for page in pages:
+            reached_oldest = False
+            
+            for execution in page['executions']:
+                execution_arn = execution['executionArn']
+                if execution_arn in unresolved and execution['status'] in TERMINAL_STATUSES:
+                    unresolved.discard(execution_arn)
+                    self._resolve_pending(execution_arn, execution['status'])
+                
+                if execution['startDate'].timestamp() < oldest_start:
+                    reached_oldest = True
+            
+            if reached_oldest or not unresolved:
+                return
+    
     def run_load_test(self, num_executions=10, max_workers=3, delay_between_executions=1):
         """
         Run a load test with multiple parallel executions
@@ -157,26 +422,36 @@ class DummyDataGenerator:
         print(f"   Max parallel workers: {max_workers}")
         print(f"   Delay between executions: {delay_between_executions}s")
         
+        # Each worker polls while another starts, so size the pool to avoid queueing
+        required_pool_connections = max(2 * max_workers, DEFAULT_MAX_POOL_CONNECTIONS)
+        if required_pool_connections > self.max_pool_connections:
+            self._create_clients(required_pool_connections)
+        
         results = []
         
+        def execute_at(scheduled_start, test_case, execution_name):
+            # Wait for this execution's slot inside the worker so submission
+            # never blocks the main thread and overlaps with polling
+            time.sleep(max(0, scheduled_start - time.time()))
+            return self.execute_step_function(test_case, execution_name)
+        
         with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            # Submit all executions
+            # Submit all executions, each scheduled at a fixed offset from the start
             future_to_execution = {}
+            load_start = time.time()
             
+            test_cases = self.generate_test_cases(num_executions)
             for i in range(num_executions):
-                test_case = self.generate_test_case()
-                execution_name = f"load-test-{i+1:03d}-{int(time.time())}"
+                test_case = test_cases[i]
+                execution_name = f"load-test-{i+1:03d}-{int(load_start)}"
+                scheduled_start = load_start + i * delay_between_executions
                 
-                future = executor.submit(self.execute_step_function, test_case, execution_name)
+                future = executor.submit(execute_at, scheduled_start, test_case, execution_name)
                 future_to_execution[future] = {
                     'execution_number': i + 1,
                     'execution_name': execution_name,
                     'test_case': test_case
                 }
-                
-                # Add delay between submissions
-                if i < num_executions - 1:
-                    time.sleep(delay_between_executions)
             
             # Collect results as they complete
             for future in as_completed(future_to_execution):
@@ -204,60 +479,257 @@ class DummyDataGenerator:
         
         return results
     
-    def run_continuous_stream(self, duration_minutes=5, executions_per_minute=6):
+    async def _execute_async(self, sfn_client, sync_sfn_client, test_input, execution_name):
+        """
+        Execute Step Function with test input on an asyncio event loop
+        
+        Args:
+            sfn_client: aioboto3 Step Functions client
+            sync_sfn_client: aioboto3 Step Functions client without retries,
+                used for StartSyncExecution
+            test_input (dict): Input for Step Function
+            execution_name (str): Name for execution
+            
+        Returns:
+            dict: Execution result with status and timing
+        """
+        start_time = time.time()
+        
+        try:
+            if self.state_machine_type == 'EXPRESS':
+                status_response = await sync_sfn_client.start_sync_execution(
+                    stateMachineArn=self.step_function_arn,
+                    name=execution_name,
+                    input=json.dumps(test_input)
+                )
+                execution_arn = status_response['executionArn']
+            else:
+                response = await sfn_client.start_execution(
+                    stateMachineArn=self.step_function_arn,
+                    name=execution_name,
+                    input=json.dumps(test_input)
+                )
+                execution_arn = response['executionArn']
+                
+                max_wait_time = 60  # seconds
+                wait_start = time.time()
+                attempt = 0
+                status_response = None
+                
+                while time.time() - wait_start < max_wait_time:
+                    status_response = await sfn_client.describe_execution(
+                        executionArn=execution_arn
+                    )
+                    
+                    if status_response['status'] in TERMINAL_STATUSES:
+                        break
+                    
+                    elapsed = time.time() - wait_start
+                    if elapsed < 0.5:
+                        delay = 0.05
+                    else:
+                        delay = min(2.0, 0.1 * (1.5 ** attempt)) + random.uniform(0, 0.05)
+                        attempt += 1
+                    await asyncio.sleep(max(0, min(delay, max_wait_time - elapsed)))
+                else:
+                    return {
+                        'execution_name': execution_name,
+                        'execution_arn': execution_arn,
+                        'status': 'TIMEOUT',
+                        'duration': time.time() - start_time,
+                        'input': test_input,
+                        'error': 'Execution timed out waiting for completion'
+                    }
+            
+            return self._execution_result(
+                execution_name, execution_arn, test_input, status_response, start_time
+            )
+            
+        except Exception as e:
+            return {
+                'execution_name': execution_name,
+                'status': 'ERROR',
+                'duration': time.time() - start_time,
+                'input': test_input,
+                'error': str(e)
+            }
+    
+    async def run_load_test_async(self, num_executions=10, max_workers=3, delay_between_executions=1):
+        """
+        Run a load test with asyncio tasks instead of OS threads
+        
+        Requires the optional aioboto3 package. Every execution is a cheap
+        task on one event loop, so max_workers can be raised far beyond what
+        the ThreadPoolExecutor path can sustain.
+        
+        Args:
+            num_executions (int): Number of executions to run
+            max_workers (int): Maximum in-flight executions
+            delay_between_executions (float): Delay in seconds between starting executions
+            
+        Returns:
+            list: Results from all executions
+        """
+        import aioboto3
+        from aiobotocore.config import AioConfig
+        
+        print(f"🚀 Starting async load test with {num_executions} executions...")
+        print(f"   Max in-flight executions: {max_workers}")
+        print(f"   Delay between executions: {delay_between_executions}s")
+        
+        config = AioConfig(
+            max_pool_connections=max(2 * max_workers, DEFAULT_MAX_POOL_CONNECTIONS),
+            retries={'max_attempts': 10, 'mode': 'adaptive'}
+        )
+        sync_config = AioConfig(
+            max_pool_connections=max(2 * max_workers, DEFAULT_MAX_POOL_CONNECTIONS),
+            retries={'total_max_attempts': 1},
+            read_timeout=SYNC_EXECUTION_READ_TIMEOUT
+        )
+        semaphore = asyncio.Semaphore(max_workers)
+        results = []
+        session = aioboto3.Session(region_name=self._session.region_name)
+        
+        async with session.client('stepfunctions', config=config) as sfn_client, \
+                session.client('stepfunctions', config=sync_config) as sync_sfn_client:
+            
+            async def run_one(execution_number, test_case, execution_name):
+                # Stagger start times the same way the threaded path does
+                await asyncio.sleep((execution_number - 1) * delay_between_executions)
+                async with semaphore:
+                    result = await self._execute_async(sfn_client, sync_sfn_client, test_case, execution_name)
+                result['execution_number'] = execution_number
+                return result
+            
+            tasks = []
+            test_cases = self.generate_test_cases(num_executions)
+            for i in range(num_executions):
+                test_case = test_cases[i]
+                execution_name = f"load-test-{i+1:03d}-{int(time.time())}"
+                tasks.append(run_one(i + 1, test_case, execution_name))
+            
+            for next_result in asyncio.as_completed(tasks):
+                result = await next_result
+                results.append(result)
+                
+                # Print progress
+                status_emoji = "✅" if result['status'] == 'SUCCEEDED' else "❌"
+                print(f"{status_emoji} Execution {result['execution_number']:3d}: "
+                      f"{result['status']} ({result['duration']:.2f}s)")
+        
+        return results
+    
+    def run_continuous_stream(self, duration_minutes=5, executions_per_minute=6, output_file=None):
         """
         Run a continuous stream of executions for testing
         
+        Results are appended to a JSONL file as they complete and only running
+        statistics are kept in memory, so long streams have a flat footprint.
+        
         Args:
             duration_minutes (int): How long to run the stream
             executions_per_minute (int): Rate of executions
+            output_file (str): JSONL file for results (default: stream_<timestamp>.jsonl)
+            
+        Returns:
+            dict: Running statistics, including the path of the results file
         """
         total_executions = duration_minutes * executions_per_minute
         delay_between_executions = 60.0 / executions_per_minute
         
+        if not output_file:
+            output_file = f"stream_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl"
+        
         print(f"🌊 Starting continuous stream for {duration_minutes} minutes...")
         print(f"   Rate: {executions_per_minute} executions per minute")
         print(f"   Total executions: {total_executions}")
         print(f"   Delay between executions: {delay_between_executions:.2f}s")
+        print(f"   Writing results to: {output_file}")
         
-        results = []
+        stats = self._new_stats()
+        stats['results_file'] = output_file
         start_time = time.time()
         
-        for i in range(total_executions):
-            test_case = self.generate_test_case()
-            execution_name = f"stream-{i+1:03d}-{int(time.time())}"
-            
-            result = self.execute_step_function(test_case, execution_name)
-            result['execution_number'] = i + 1
-            results.append(result)
-            
-            # Print progress
-            status_emoji = "✅" if result['status'] == 'SUCCEEDED' else "❌"
-            elapsed_minutes = (time.time() - start_time) / 60
-            print(f"{status_emoji} [{elapsed_minutes:4.1f}m] Execution {i+1:3d}: "
-                  f"{result['status']} ({result['duration']:.2f}s) - {result['input']['s3_key']}")
-            
-            # Wait before next execution
-            if i < total_executions - 1:
-                time.sleep(delay_between_executions)
+        test_cases = self.generate_test_cases(total_executions)
+        with open(output_file, 'w') as out:
+            for i in range(total_executions):
+                test_case = test_cases[i]
+                execution_name = f"stream-{i+1:03d}-{int(time.time())}"
+                
+                result = self.execute_step_function(test_case, execution_name)
+                result['execution_number'] = i + 1
+                out.write(json.dumps(result) + '\n')
+                self._update_stats(stats, result)
+                
+                # Print progress
+                status_emoji = "✅" if result['status'] == 'SUCCEEDED' else "❌"
+                elapsed_minutes = (time.time() - start_time) / 60
+                print(f"{status_emoji} [{elapsed_minutes:4.1f}m] Execution {i+1:3d}: "
+                      f"{result['status']} ({result['duration']:.2f}s) - {result['input']['s3_key']}")
+                
+                # Wait before next execution
+                if i < total_executions - 1:
+                    time.sleep(delay_between_executions)
         
-        return results
+        return stats
     
-    def analyze_results(self, results):
-        """Analyze and print statistics from test results"""
-        if not results:
+    def _new_stats(self):
+        """Create an empty set of running result statistics"""
+        return {
+            'total': 0,
+            'succeeded': 0,
+            'failed': 0,
+            'errors': 0,
+            'duration_count': 0,
+            'duration_sum': 0.0,
+            'min_duration': float('inf'),
+            'max_duration': float('-inf'),
+            'error_details': []
+        }
+    
+    def _update_stats(self, stats, result):
+        """Fold a single execution result into the running statistics"""
+        stats['total'] += 1
+        
+        status = result['status']
+        if status == 'SUCCEEDED':
+            stats['succeeded'] += 1
+        elif status == 'FAILED':
+            stats['failed'] += 1
+        elif status in ('ERROR', 'EXCEPTION', 'TIMEOUT'):
+            stats['errors'] += 1
+        
+        if status in ('FAILED', 'ERROR', 'EXCEPTION', 'TIMEOUT'):
+            stats['error_details'].append(
+                (result['execution_name'], result.get('error', 'Unknown error'))
+            )
+        
+        duration = result.get('duration')
+        if duration is not None:
+            stats['duration_count'] += 1
+            stats['duration_sum'] += duration
+            if duration < stats['min_duration']:
+                stats['min_duration'] = duration
+            if duration > stats['max_duration']:
+                stats['max_duration'] = duration
+    
+    def print_stats(self, stats):
+        """Print statistics gathered by analyze_results or run_continuous_stream"""
+        total = stats['total']
+        if not total:
             print("No results to analyze")
             return
         
-        total = len(results)
-        succeeded = len([r for r in results if r['status'] == 'SUCCEEDED'])
-        failed = len([r for r in results if r['status'] == 'FAILED'])
-        errors = len([r for r in results if r['status'] in ['ERROR', 'EXCEPTION', 'TIMEOUT']])
+        succeeded = stats['succeeded']
+        failed = stats['failed']
+        errors = stats['errors']
         
-        durations = [r['duration'] for r in results if 'duration' in r]
-        avg_duration = sum(durations) / len(durations) if durations else 0
-        min_duration = min(durations) if durations else 0
-        max_duration = max(durations) if durations else 0
+        if stats['duration_count']:
+            avg_duration = stats['duration_sum'] / stats['duration_count']
+            min_duration = stats['min_duration']
+            max_duration = stats['max_duration']
+        else:
+            avg_duration = min_duration = max_duration = 0
         
         print(f"\\n📊 Test Results Analysis:")
         print(f"   Total Executions: {total}")
@@ -269,12 +741,18 @@ class DummyDataGenerator:
         print(f"   📉 Max Duration: {max_duration:.2f}s")
         
         # Show error details
-        if failed > 0 or errors > 0:
+        if stats['error_details']:
             print(f"\\n⚠️  Error Details:")
-            for result in results:
-                if result['status'] in ['FAILED', 'ERROR', 'EXCEPTION', 'TIMEOUT']:
-                    print(f"   {result['execution_name']}: {result.get('error', 'Unknown error')}")
-
+            for execution_name, error in stats['error_details']:
+                print(f"   {execution_name}: {error}")
+    
+    def analyze_results(self, results):
+        """Analyze and print statistics from test results in a single pass"""
+        stats = self._new_stats()
+        for r in results:
+            self._update_stats(stats, r)
+        self.print_stats(stats)
+        return stats
 
 def main():
     """Main CLI interface"""
@@ -287,10 +765,13 @@ def main():
     parser.add_argument('--workers', type=int, default=3, help='Max parallel workers for load test')
     parser.add_argument('--duration', type=int, default=5, help='Duration in minutes for stream test')
     parser.add_argument('--rate', type=int, default=6, help='Executions per minute for stream test')
+    parser.add_argument('--manifest-key', help='S3 key of a gzip manifest listing test image keys')
+    parser.add_argument('--async', dest='use_async', action='store_true',
+                       help='Run load test on asyncio with aioboto3 instead of threads')
     
     args = parser.parse_args()
     
-    generator = DummyDataGenerator(args.bucket, args.step_function_arn)
+    generator = DummyDataGenerator(args.bucket, args.step_function_arn, manifest_key=args.manifest_key)
     
     if args.mode == 'single':
         print("Running single test execution...")
@@ -301,19 +782,25 @@ def main():
         
     elif args.mode == 'load':
         print(f"Running load test with {args.count} executions...")
-        results = generator.run_load_test(
-            num_executions=args.count,
-            max_workers=args.workers
-        )
+        if args.use_async:
+            results = asyncio.run(generator.run_load_test_async(
+                num_executions=args.count,
+                max_workers=args.workers
+            ))
+        else:
+            results = generator.run_load_test(
+                num_executions=args.count,
+                max_workers=args.workers
+            )
         generator.analyze_results(results)
         
     elif args.mode == 'stream':
         print(f"Running continuous stream for {args.duration} minutes...")
-        results = generator.run_continuous_stream(
+        stats = generator.run_continuous_stream(
             duration_minutes=args.duration,
             executions_per_minute=args.rate
         )
-        generator.analyze_results(results)
+        generator.print_stats(stats)
 
 
 if __name__ == "__main__":
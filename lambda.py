@@ -6,36 +6,26 @@
 """
 Function Name: SerializeImageData
 Runtime: Python 3.8
-Description: Downloads image from S3 and base64 encodes it
+Description: Passes the S3 image reference on to the classification step
 Handler: lambda_function.lambda_handler
 """
 
 import json
-import boto3
-import base64
-
-s3 = boto3.client('s3')
 
 def lambda_handler(event, context):
     """A function to serialize target data from S3"""
     
-    # Get the s3 address from the Step Function event input
+    # Get the s3 address from the Step Function event input. ImageClassification
+    # reads the bytes from s3 itself (and reports a missing key), so the image
+    # is neither fetched here nor base64-encoded into the state payload
     key = event['s3_key']
     bucket = event['s3_bucket']
-    
-    # Download the data from s3 to /tmp/image.png
-    s3.download_file(bucket, key, '/tmp/image.png')
-    
-    # We read the data from a file
-    with open("/tmp/image.png", "rb") as f:
-        image_data = base64.b64encode(f.read())
 
     # Pass the data back to the Step Function
     print("Event:", event.keys())
     return {
         'statusCode': 200,
         'body': {
-            "image_data": image_data,
             "s3_bucket": bucket,
             "s3_key": key,
             "inferences": []
@@ -54,26 +44,45 @@ Handler: lambda_function.lambda_handler
 Note: Uses boto3 SageMaker runtime (more reliable than SageMaker SDK in Lambda)
 """
 
-import json
+import os
 import boto3
 import base64
+from botocore.config import Config
+
+# Resolved once at init rather than on every invocation
+ENDPOINT = os.environ.get('SM_ENDPOINT', "image-classification-2025-08-21-23-57-05-598")
+
+# Each Lambda container handles one request at a time, so a single kept-alive
+# connection to the endpoint is reused across warm invocations
+s3 = boto3.client('s3')
+runtime = boto3.client(
+    'sagemaker-runtime',
+    config=Config(
+        tcp_keepalive=True,
+        max_pool_connections=1,
+        connect_timeout=2,
+        read_timeout=30,
+        retries={'max_attempts': 3}
+    )
+)
 
 def lambda_handler(event, context):
     """Image classification using SageMaker endpoint"""
     
-    # Get the SageMaker runtime client
-    runtime = boto3.client('sagemaker-runtime')
-    
-    # Endpoint name
-    ENDPOINT = "image-classification-2025-08-21-23-57-05-598"
-    
-    # Decode the image data from the event
-    if isinstance(event['body']['image_data'], str):
+    # Read the image straight from s3 when no inline image data is passed in,
+    # which keeps the base64 payload out of the Step Function state
+    image_data = event['body'].get('image_data')
+    if not image_data:
+        image = s3.get_object(
+            Bucket=event['body']['s3_bucket'],
+            Key=event['body']['s3_key']
+        )['Body'].read()
+    elif isinstance(image_data, str):
         # If it's a string, decode from base64
-        image = base64.b64decode(event['body']['image_data'])
+        image = base64.b64decode(image_data)
     else:
         # If it's already bytes, decode first
-        image_b64 = event['body']['image_data'].decode('utf-8')
+        image_b64 = image_data.decode('utf-8')
         image = base64.b64decode(image_b64)
     
     # Make a prediction using SageMaker runtime
@@ -90,9 +99,11 @@ def lambda_handler(event, context):
     # Update the event with inferences
     event["inferences"] = inferences
     
+    # Returned as a dict so Step Functions reads it without another
+    # encode/decode round-trip
     return {
         'statusCode': 200,
-        'body': json.dumps(event)
+        'body': event
     }
 
 
@@ -108,17 +119,35 @@ Handler: lambda_filter.lambda_handler (deployed version)
 
 import json
 
+# orjson is a C extension that is several times faster than the standard
+# library on these payloads; fall back to json if the layer is missing
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
+
 THRESHOLD = 0.93
 
 def lambda_handler(event, context):
     """Filter low confidence inferences"""
     
-    # Grab the inferences from the event
-    inferences = json.loads(event['body'])['inferences']
-    inferences = json.loads(inferences)
-    
-    # Check if any values in our inferences are above THRESHOLD
-    meets_threshold = max(inferences) >= THRESHOLD
+    # Grab the inferences from the event (the body may already be parsed
+    # depending on how the Step Function passes the payload through)
+    body = event['body']
+    if isinstance(body, str):
+        body = json_loads(body)
+    inferences = body['inferences']
+    if isinstance(inferences, str):
+        inferences = json_loads(inferences)
+    
+    # Check if any values in our inferences are above THRESHOLD,
+    # stopping at the first one that is
+    meets_threshold = False
+    for value in inferences:
+        if value >= THRESHOLD:
+            meets_threshold = True
+            break
     
     # If our threshold is met, pass our data back out of the
     # Step Function, else, end the Step Function with an error
@@ -129,7 +158,7 @@ def lambda_handler(event, context):
 
     return {
         'statusCode': 200,
-        'body': json.dumps(event)
+        'body': event
     }
 
 
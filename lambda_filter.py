@@ -1,16 +1,34 @@
 import json
 
+# orjson is a C extension that is several times faster than the standard
+# library on these payloads; fall back to json if the layer is missing
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
+
 THRESHOLD = 0.93
 
 def lambda_handler(event, context):
     """Filter low confidence inferences"""
     
-    # Grab the inferences from the event
-    inferences = json.loads(event['body'])['inferences']
-    inferences = json.loads(inferences)
+    # Grab the inferences from the event (the body may already be parsed
+    # depending on how the Step Function passes the payload through)
+    body = event['body']
+    if isinstance(body, str):
+        body = json_loads(body)
+    inferences = body['inferences']
+    if isinstance(inferences, str):
+        inferences = json_loads(inferences)
     
-    # Check if any values in our inferences are above THRESHOLD
-    meets_threshold = max(inferences) >= THRESHOLD
+    # Check if any values in our inferences are above THRESHOLD,
+    # stopping at the first one that is
+    meets_threshold = False
+    for value in inferences:
+        if value >= THRESHOLD:
+            meets_threshold = True
+            break
     
     # If our threshold is met, pass our data back out of the
     # Step Function, else, end the Step Function with an error
@@ -21,5 +39,5 @@ def lambda_handler(event, context):
 
     return {
         'statusCode': 200,
-        'body': json.dumps(event)
+        'body': event
     }
\ No newline at end of file
@@ -1,23 +1,42 @@
-import json
+import os
 import boto3
 import base64
+from botocore.config import Config
+
+# Resolved once at init rather than on every invocation
+ENDPOINT = os.environ.get('SM_ENDPOINT', "image-classification-2025-08-21-23-57-05-598")
+
+# Each Lambda container handles one request at a time, so a single kept-alive
+# connection to the endpoint is reused across warm invocations
+s3 = boto3.client('s3')
+runtime = boto3.client(
+    'sagemaker-runtime',
+    config=Config(
+        tcp_keepalive=True,
+        max_pool_connections=1,
+        connect_timeout=2,
+        read_timeout=30,
+        retries={'max_attempts': 3}
+    )
+)
 
 def lambda_handler(event, context):
     """Image classification using SageMaker endpoint"""
     
-    # Get the SageMaker runtime client
-    runtime = boto3.client('sagemaker-runtime')
-    
-    # Endpoint name
-    ENDPOINT = "image-classification-2025-08-21-23-57-05-598"
-    
-    # Decode the image data from the event
-    if isinstance(event['body']['image_data'], str):
+    # Read the image straight from s3 when no inline image data is passed in,
+    # which keeps the base64 payload out of the Step Function state
+    image_data = event['body'].get('image_data')
+    if not image_data:
+        image = s3.get_object(
+            Bucket=event['body']['s3_bucket'],
+            Key=event['body']['s3_key']
+        )['Body'].read()
+    elif isinstance(image_data, str):
         # If it's a string, decode from base64
-        image = base64.b64decode(event['body']['image_data'])
+        image = base64.b64decode(image_data)
     else:
         # If it's already bytes, decode first
-        image_b64 = event['body']['image_data'].decode('utf-8')
+        image_b64 = image_data.decode('utf-8')
         image = base64.b64decode(image_b64)
     
     # Make a prediction using SageMaker runtime
@@ -34,7 +53,9 @@ def lambda_handler(event, context):
     # Update the event with inferences
     event["inferences"] = inferences
     
+    # Returned as a dict so Step Functions reads it without another
+    # encode/decode round-trip
     return {
         'statusCode': 200,
-        'body': json.dumps(event)
+        'body': event
     }
\ No newline at end of file
@@ -4,11 +4,46 @@ Multi-Class Vehicle Extension for Scones Unlimited ML Workflow
 Extends the binary bicycle/motorcycle classifier to support additional vehicle types
 """
 
+import os
 import json
+import sys
 import boto3
-import numpy as np
+from botocore.config import Config
 from typing import Dict, List, Any
 
+# orjson is a C extension that is several times faster than the standard
+# library on these payloads; fall back to json if the layer is missing
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
+
+# SageMaker runtime client, created on first use (so importing the module for
+# the offline analytics doesn't need AWS configuration) and then reused by
+# warm invocations
+runtime = None
+
+def get_runtime_client():
+    """Return the container's shared SageMaker runtime client"""
+    global runtime
+    if runtime is None:
+        runtime = boto3.client(
+            'sagemaker-runtime',
+            config=Config(max_pool_connections=10, retries={'max_attempts': 3})
+        )
+    return runtime
+
+# S3 client for reading images that aren't passed inline, created on first use
+s3 = None
+
+def get_s3_client():
+    """Return the container's shared S3 client"""
+    global s3
+    if s3 is None:
+        s3 = boto3.client('s3')
+    return s3
+
 # =============================================================================
 # Extended Vehicle Classes from CIFAR-100
 # =============================================================================
@@ -26,6 +61,9 @@ VEHICLE_CLASSES = {
     9: "lawn_mower"
 }
 
+# Number of ranked predictions returned by the classifier
+TOP_K_PREDICTIONS = 5
+
 # Enhanced routing rules for Scones Unlimited delivery optimization
 ROUTING_RULES = {
     "bicycle": {
@@ -79,6 +117,9 @@ ROUTING_RULES = {
     }
 }
 
+# Routing rules indexed by class id, so the classifier can look them up by position
+ROUTING_BY_ID = tuple(ROUTING_RULES.get(VEHICLE_CLASSES[i], {}) for i in range(len(VEHICLE_CLASSES)))
+
 # =============================================================================
 # Enhanced Lambda Function: Multi-Class Image Classification
 # =============================================================================
@@ -89,37 +130,44 @@ Description: Classifies images into multiple vehicle categories
 Handler: lambda_function.lambda_handler
 """
 
+# Multi-class endpoint (would need to be trained separately)
+MULTICLASS_ENDPOINT = os.environ.get('MULTICLASS_ENDPOINT', "multi-vehicle-classification-endpoint")
+
 def multi_class_lambda_handler(event, context):
     """Enhanced image classification with multiple vehicle types"""
     
-    runtime = boto3.client('sagemaker-runtime')
-    
-    # Multi-class endpoint (would need to be trained separately)
-    MULTICLASS_ENDPOINT = "multi-vehicle-classification-endpoint"
-    
-    # Get image data from previous step
-    image_data = event.get("image_data", "")
-    s3_bucket = event.get("s3_bucket", "")
-    s3_key = event.get("s3_key", "")
+    # Get image location from previous step; SerializeImageData wraps it in
+    # 'body' and no longer sends the image itself
+    body = event.get("body", event)
+    if isinstance(body, str):
+        body = json_loads(body)
+    image_data = body.get("image_data", "")
+    s3_bucket = body.get("s3_bucket", "")
+    s3_key = body.get("s3_key", "")
     
-    if not image_data:
+    if not image_data and not (s3_bucket and s3_key):
         return {
             'statusCode': 400,
-            'body': json.dumps({
+            'body': {
                 'error': 'No image data provided',
                 's3_bucket': s3_bucket,
                 's3_key': s3_key
-            })
+            }
         }
     
     try:
         import base64
+        # Imported here so NumPy only loads when a prediction is made, not on cold start
+        import numpy as np
         
-        # Decode the image
-        image = base64.b64decode(image_data)
+        # Read the image straight from S3 unless it was passed inline
+        if image_data:
+            image = base64.b64decode(image_data)
+        else:
+            image = get_s3_client().get_object(Bucket=s3_bucket, Key=s3_key)['Body'].read()
         
         # Make prediction using multi-class SageMaker endpoint
-        response = runtime.invoke_endpoint(
+        response = get_runtime_client().invoke_endpoint(
             EndpointName=MULTICLASS_ENDPOINT,
             ContentType='image/png',
             Body=image
@@ -129,25 +177,31 @@ def multi_class_lambda_handler(event, context):
         result = response['Body'].read()
         inferences = json.loads(result.decode('utf-8'))
         
-        # Process multi-class predictions
-        predictions = []
-        for i, confidence in enumerate(inferences):
-            if i < len(VEHICLE_CLASSES):
-                predictions.append({
-                    "class_id": i,
-                    "class_name": VEHICLE_CLASSES[i],
-                    "confidence": float(confidence)
-                })
+        # Process multi-class predictions, ignoring any scores past the known classes
+        scores = np.asarray(inferences[:len(VEHICLE_CLASSES)], dtype=np.float64)
+        
+        # Only build per-class entries for the top-k predictions, highest first.
+        # The sort is stable so tied scores keep class order, and the top
+        # prediction is the first of them, as max() used to pick
+        top_ids = np.argsort(-scores, kind='stable')[:TOP_K_PREDICTIONS]
+        predictions = [
+            {
+                "class_id": int(i),
+                "class_name": VEHICLE_CLASSES[int(i)],
+                "confidence": float(scores[i])
+            }
+            for i in top_ids
+        ]
         
         # Find top prediction
-        top_prediction = max(predictions, key=lambda x: x['confidence'])
+        top_prediction = predictions[0]
         
         # Get routing information
-        routing_info = ROUTING_RULES.get(top_prediction['class_name'], {})
+        routing_info = ROUTING_BY_ID[top_prediction['class_id']]
         
         return {
             'statusCode': 200,
-            'body': json.dumps({
+            'body': {
                 'image_data': image_data,
                 's3_bucket': s3_bucket,
                 's3_key': s3_key,
@@ -159,18 +213,18 @@ def multi_class_lambda_handler(event, context):
                     'classes_supported': len(VEHICLE_CLASSES),
                     'prediction_timestamp': context.aws_request_id
                 }
-            })
+            }
         }
         
     except Exception as e:
         return {
             'statusCode': 500,
-            'body': json.dumps({
+            'body': {
                 'error': str(e),
                 'image_data': image_data,
                 's3_bucket': s3_bucket,
                 's3_key': s3_key
-            })
+            }
         }
 
 
@@ -198,12 +252,37 @@ CONFIDENCE_THRESHOLDS = {
     "lawn_mower": 0.90    # High threshold - edge case
 }
 
+# Vehicle groups used by the business rules (frozensets of interned names,
+# so membership is a hash lookup rather than a list scan)
+DELIVERABLE_VEHICLES = frozenset(map(sys.intern, ['bicycle', 'motorcycle', 'automobile', 'pickup_truck']))
+SUPPORTED_DELIVERY_VEHICLES = DELIVERABLE_VEHICLES | {sys.intern('truck')}
+MANUAL_REVIEW_VEHICLES = frozenset(map(sys.intern, ['tank', 'streetcar', 'tractor']))
+SHORT_ROUTE_VEHICLES = frozenset(map(sys.intern, ['bicycle', 'motorcycle']))
+MEDIUM_ROUTE_VEHICLES = frozenset(map(sys.intern, ['automobile', 'pickup_truck']))
+
+# Thresholds indexed by class id, so predictions can be checked without hashing names
+THRESHOLDS_BY_ID = tuple(CONFIDENCE_THRESHOLDS.get(VEHICLE_CLASSES[i], 0.95) for i in range(len(VEHICLE_CLASSES)))
+
+def threshold_for(prediction):
+    """Confidence threshold for a prediction, by class id when it has a valid one"""
+    class_id = prediction.get('class_id')
+    # Checked explicitly: a negative id would otherwise index from the end
+    if isinstance(class_id, int) and 0 <= class_id < len(THRESHOLDS_BY_ID):
+        return THRESHOLDS_BY_ID[class_id]
+    return CONFIDENCE_THRESHOLDS.get(prediction.get('class_name', 'unknown'), 0.95)
+
+# Error message templates, only formatted when the exception is actually raised
+_ERR_BELOW_THRESHOLD = "CONFIDENCE_BELOW_THRESHOLD: {} confidence {:.3f} below required {}"
+_ERR_UNSUPPORTED_VEHICLE = "UNSUPPORTED_VEHICLE_TYPE: {} not suitable for delivery operations"
+
 def multi_class_filter_lambda_handler(event, context):
     """Filter multi-class predictions and provide routing decisions"""
     
     try:
         # Extract data from previous step
-        body = json.loads(event.get('body', '{}'))
+        body = event.get('body') or {}
+        if isinstance(body, str):
+            body = json_loads(body)
         predictions = body.get('predictions', [])
         top_prediction = body.get('top_prediction', {})
         routing_info = body.get('routing_info', {})
@@ -212,9 +291,9 @@ def multi_class_filter_lambda_handler(event, context):
             raise Exception("NO_PREDICTIONS_RECEIVED")
         
         # Apply vehicle-specific confidence threshold
-        vehicle_type = top_prediction.get('class_name', 'unknown')
+        vehicle_type = sys.intern(top_prediction.get('class_name', 'unknown'))
         confidence = top_prediction.get('confidence', 0.0)
-        threshold = CONFIDENCE_THRESHOLDS.get(vehicle_type, 0.95)
+        threshold = threshold_for(top_prediction)
         
         # Determine if prediction meets threshold
         meets_threshold = confidence >= threshold
@@ -224,14 +303,17 @@ def multi_class_filter_lambda_handler(event, context):
             vehicle_type, confidence, routing_info, meets_threshold
         )
         
-        # Filter all predictions by their respective thresholds
-        filtered_predictions = []
-        for pred in predictions:
-            pred_threshold = CONFIDENCE_THRESHOLDS.get(pred['class_name'], 0.95)
+        # Filter all predictions by their respective thresholds; there are only
+        # TOP_K_PREDICTIONS of them, so a plain loop beats loading NumPy here
+        high_confidence_indices = []
+        for i, pred in enumerate(predictions):
+            pred_threshold = threshold_for(pred)
             pred['meets_threshold'] = pred['confidence'] >= pred_threshold
             pred['threshold_used'] = pred_threshold
+            # Each prediction carries meets_threshold, so only refer to the
+            # high-confidence ones by index rather than serializing them twice
             if pred['meets_threshold']:
-                filtered_predictions.append(pred)
+                high_confidence_indices.append(i)
         
         response_body = {
             'vehicle_classification': {
@@ -241,25 +323,25 @@ def multi_class_filter_lambda_handler(event, context):
                 'meets_threshold': meets_threshold
             },
             'all_predictions': predictions,
-            'high_confidence_predictions': filtered_predictions,
+            'high_confidence_indices': high_confidence_indices,
             'routing_decision': routing_decision,
             'business_rules': {
-                'can_deliver': meets_threshold and vehicle_type in ['bicycle', 'motorcycle', 'automobile', 'pickup_truck'],
-                'requires_manual_review': not meets_threshold or vehicle_type in ['tank', 'streetcar', 'tractor'],
+                'can_deliver': meets_threshold and vehicle_type in DELIVERABLE_VEHICLES,
+                'requires_manual_review': not meets_threshold or vehicle_type in MANUAL_REVIEW_VEHICLES,
                 'eco_friendly_option': routing_info.get('eco_friendly', False)
             }
         }
         
         # Raise exception if prediction doesn't meet business requirements
         if not meets_threshold:
-            raise Exception(f"CONFIDENCE_BELOW_THRESHOLD: {vehicle_type} confidence {confidence:.3f} below required {threshold}")
+            raise Exception(_ERR_BELOW_THRESHOLD.format(vehicle_type, confidence, threshold))
         
-        if vehicle_type not in ['bicycle', 'motorcycle', 'automobile', 'pickup_truck', 'truck']:
-            raise Exception(f"UNSUPPORTED_VEHICLE_TYPE: {vehicle_type} not suitable for delivery operations")
+        if vehicle_type not in SUPPORTED_DELIVERY_VEHICLES:
+            raise Exception(_ERR_UNSUPPORTED_VEHICLE.format(vehicle_type))
         
         return {
             'statusCode': 200,
-            'body': json.dumps(response_body)
+            'body': response_body
         }
         
     except Exception as e:
@@ -275,10 +357,40 @@ def multi_class_filter_lambda_handler(event, context):
         
         return {
             'statusCode': 200,
-            'body': json.dumps(error_body)
+            'body': error_body
         }
 
 
+# Static parts of each route assignment; generate_routing_decision copies one
+# and fills in the vehicle's capacity (None placeholders keep the key order)
+_SHORT_ROUTE = {
+    'action': 'ASSIGN_ROUTE',
+    'route_type': 'SHORT_DISTANCE',
+    'max_distance_km': None,
+    'max_weight_kg': None,
+    'priority': 'HIGH',  # Fast, eco-friendly options
+    'special_instructions': 'Weather-dependent scheduling'
+}
+
+_MEDIUM_ROUTE = {
+    'action': 'ASSIGN_ROUTE',
+    'route_type': 'MEDIUM_DISTANCE',
+    'max_distance_km': None,
+    'max_weight_kg': None,
+    'priority': 'MEDIUM',
+    'special_instructions': 'All-weather capable'
+}
+
+_LONG_ROUTE = {
+    'action': 'ASSIGN_ROUTE',
+    'route_type': 'LONG_DISTANCE_BULK',
+    'max_distance_km': None,
+    'max_weight_kg': None,
+    'priority': 'LOW',  # For bulk deliveries
+    'special_instructions': 'Commercial delivery routes only'
+}
+
+
 def generate_routing_decision(vehicle_type: str, confidence: float, routing_info: Dict, meets_threshold: bool) -> Dict[str, Any]:
     """Generate intelligent routing decision based on vehicle classification"""
     
@@ -290,35 +402,23 @@ def generate_routing_decision(vehicle_type: str, confidence: float, routing_info
         }
     
     # Business logic for vehicle assignment
-    if vehicle_type in ['bicycle', 'motorcycle']:
-        return {
-            'action': 'ASSIGN_ROUTE',
-            'route_type': 'SHORT_DISTANCE',
-            'max_distance_km': routing_info.get('max_distance', 5),
-            'max_weight_kg': routing_info.get('max_weight', 10),
-            'priority': 'HIGH',  # Fast, eco-friendly options
-            'special_instructions': 'Weather-dependent scheduling'
-        }
-    
-    elif vehicle_type in ['automobile', 'pickup_truck']:
-        return {
-            'action': 'ASSIGN_ROUTE', 
-            'route_type': 'MEDIUM_DISTANCE',
-            'max_distance_km': routing_info.get('max_distance', 50),
-            'max_weight_kg': routing_info.get('max_weight', 50),
-            'priority': 'MEDIUM',
-            'special_instructions': 'All-weather capable'
-        }
+    if vehicle_type in SHORT_ROUTE_VEHICLES:
+        decision = _SHORT_ROUTE.copy()
+        decision['max_distance_km'] = routing_info.get('max_distance', 5)
+        decision['max_weight_kg'] = routing_info.get('max_weight', 10)
+        return decision
+    
+    elif vehicle_type in MEDIUM_ROUTE_VEHICLES:
+        decision = _MEDIUM_ROUTE.copy()
+        decision['max_distance_km'] = routing_info.get('max_distance', 50)
+        decision['max_weight_kg'] = routing_info.get('max_weight', 50)
+        return decision
     
     elif vehicle_type == 'truck':
-        return {
-            'action': 'ASSIGN_ROUTE',
-            'route_type': 'LONG_DISTANCE_BULK',
-            'max_distance_km': routing_info.get('max_distance', 100),
-            'max_weight_kg': routing_info.get('max_weight', 500),
-            'priority': 'LOW',  # For bulk deliveries
-            'special_instructions': 'Commercial delivery routes only'
-        }
+        decision = _LONG_ROUTE.copy()
+        decision['max_distance_km'] = routing_info.get('max_distance', 100)
+        decision['max_weight_kg'] = routing_info.get('max_weight', 500)
+        return decision
     
     else:
         return {
@@ -450,30 +550,83 @@ def prepare_multiclass_training_data():
 # Business Analytics for Multi-Class System
 # =============================================================================
 
+def _aggregate_fleet_loop(vehicle_ids, distances, weights, eco_flags, counts):
+    """Accumulate per-type counts and fleet totals (compiled with Numba when available)"""
+    total_distance = 0.0
+    total_weight = 0.0
+    eco_friendly_count = 0
+    
+    for i in range(len(vehicle_ids)):
+        counts[vehicle_ids[i]] += 1
+        total_distance += distances[i]
+        total_weight += weights[i]
+        if eco_flags[i]:
+            eco_friendly_count += 1
+    
+    return total_distance, total_weight, eco_friendly_count
+
+
+def _aggregate_fleet_numpy(vehicle_ids, distances, weights, eco_flags, counts):
+    """Vectorized fallback for _aggregate_fleet_loop when Numba is not installed"""
+    import numpy as np
+    
+    counts += np.bincount(vehicle_ids, minlength=len(counts))
+    return float(distances.sum()), float(weights.sum()), int(eco_flags.sum())
+
+
+_fleet_aggregator = None
+
+def _get_fleet_aggregator():
+    """Compile the aggregation loop on first use (Numba is optional and slow to import)"""
+    global _fleet_aggregator
+    
+    if _fleet_aggregator is None:
+        try:
+            from numba import njit
+        except ImportError:
+            _fleet_aggregator = _aggregate_fleet_numpy
+        else:
+            # No cache=True: Numba would write its cache next to this module,
+            # and /var/task is read-only on Lambda
+            _fleet_aggregator = njit(_aggregate_fleet_loop)
+    
+    return _fleet_aggregator
+
+
 def analyze_fleet_optimization(classification_results: List[Dict]) -> Dict:
     """Analyze classification results for fleet optimization insights"""
     
-    vehicle_counts = {}
-    total_capacity = {"distance": 0, "weight": 0}
-    eco_friendly_count = 0
+    import numpy as np
+    
+    # Extract the fields once into flat arrays; vehicle types get integer ids
+    # in first-seen order so the composition keeps its original ordering
+    total_vehicles = len(classification_results)
+    type_ids = {}
+    vehicle_ids = np.empty(total_vehicles, dtype=np.int64)
+    distances = np.empty(total_vehicles, dtype=np.float64)
+    weights = np.empty(total_vehicles, dtype=np.float64)
+    eco_flags = np.empty(total_vehicles, dtype=np.bool_)
     
-    for result in classification_results:
+    for i, result in enumerate(classification_results):
         vehicle_type = result.get('vehicle_classification', {}).get('primary_vehicle', 'unknown')
+        vehicle_ids[i] = type_ids.setdefault(vehicle_type, len(type_ids))
         
-        # Count vehicles by type
-        vehicle_counts[vehicle_type] = vehicle_counts.get(vehicle_type, 0) + 1
-        
-        # Calculate total fleet capacity
         routing_info = result.get('routing_decision', {})
-        total_capacity["distance"] += routing_info.get('max_distance_km', 0)
-        total_capacity["weight"] += routing_info.get('max_weight_kg', 0)
-        
-        # Count eco-friendly options
-        if result.get('business_rules', {}).get('eco_friendly_option', False):
-            eco_friendly_count += 1
+        distances[i] = routing_info.get('max_distance_km', 0)
+        weights[i] = routing_info.get('max_weight_kg', 0)
+        eco_flags[i] = result.get('business_rules', {}).get('eco_friendly_option', False)
+    
+    # Count vehicles by type and calculate total fleet capacity in one pass
+    counts = np.zeros(len(type_ids), dtype=np.int64)
+    total_distance, total_weight, eco_friendly_count = _get_fleet_aggregator()(
+        vehicle_ids, distances, weights, eco_flags, counts
+    )
+    
+    vehicle_counts = {vehicle_type: int(counts[type_id]) for vehicle_type, type_id in type_ids.items()}
+    total_capacity = {"distance": float(total_distance), "weight": float(total_weight)}
+    eco_friendly_count = int(eco_friendly_count)
     
     # Generate insights
-    total_vehicles = len(classification_results)
     eco_percentage = (eco_friendly_count / total_vehicles * 100) if total_vehicles > 0 else 0
     
     return {
@@ -12,15 +12,95 @@ Handler: lambda_function.lambda_handler
 """
 
 import json
-import boto3
 import base64
-from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# boto3, asyncio and the thread pool are imported by the path that needs
+# them, so a cold start only loads what the first request uses
+
+# Upper bound on S3 downloads in flight at once, on either path
+MAX_CONCURRENT_DOWNLOADS = 10
+
+# aioboto3 must be packaged with the function; without it the thread pool
+# path below is used instead. It is imported on first batch request (not on
+# cold start) and its session is kept for warm invocations.
+_AIO_SESSION = None
+_AIO_MISSING = False
+
+def get_aio_session():
+    """Return the container's shared aioboto3 session, or None if unavailable"""
+    global _AIO_SESSION, _AIO_MISSING
+    if _AIO_SESSION is None and not _AIO_MISSING:
+        try:
+            import aioboto3
+        except ImportError:
+            _AIO_MISSING = True
+        else:
+            _AIO_SESSION = aioboto3.Session()
+    return _AIO_SESSION
+
+# Created on first use (the aioboto3 path never needs it) and then
+# reused by warm invocations
+s3 = None
+
+def get_s3_client():
+    """Return the container's shared boto3 S3 client"""
+    global s3
+    if s3 is None:
+        import boto3
+        s3 = boto3.client('s3')
+    return s3
+
+# Thread pool for the fallback path, also created on first use and kept for
+# warm invocations so threads are not respawned on every request
+_S3_POOL = None
+
+def get_thread_pool():
+    """Return the container's shared download thread pool"""
+    global _S3_POOL
+    if _S3_POOL is None:
+        import atexit
+        from concurrent.futures import ThreadPoolExecutor
+        _S3_POOL = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_DOWNLOADS, thread_name_prefix='s3dl')
+        atexit.register(_S3_POOL.shutdown)
+    return _S3_POOL
+
+async def serialize_images_async(session, bucket, s3_keys):
+    """Serialize images with concurrent S3 reads on one event loop"""
+    import asyncio
+    
+    # Created per call because asyncio.run() starts a fresh event loop
+    limit = asyncio.Semaphore(MAX_CONCURRENT_DOWNLOADS)
+    
+    async with session.client('s3') as s3:
+        
+        async def serialize_single_image(s3_key):
+            """Serialize a single image"""
+            try:
+                # Stream the object straight into the encoder, no /tmp detour
+                async with limit:
+                    response = await s3.get_object(Bucket=bucket, Key=s3_key)
+                    async with response['Body'] as stream:
+                        image_bytes = await stream.read()
+                
+                return {
+                    "success": True,
+                    "s3_key": s3_key,
+                    "image_data": base64.b64encode(image_bytes).decode('ascii'),
+                    "s3_bucket": bucket
+                }
+            except Exception as e:
+                return {
+                    "success": False,
+                    "s3_key": s3_key,
+                    "error": str(e),
+                    "s3_bucket": bucket
+                }
+        
+        return await asyncio.gather(*(serialize_single_image(key) for key in s3_keys))
 
 def lambda_handler(event, context):
     """Serialize multiple images for parallel processing"""
     
-    s3 = boto3.client('s3')
-    
     # Input can be either single image or batch of images
     if isinstance(event.get('s3_keys'), list):
         # Batch processing mode
@@ -34,18 +114,14 @@ def lambda_handler(event, context):
     def serialize_single_image(s3_key):
         """Serialize a single image"""
         try:
-            # Download the data from s3 to /tmp/
-            local_file = f"/tmp/{s3_key.split('/')[-1]}"
-            s3.download_file(bucket, s3_key, local_file)
-            
-            # Read and encode the data
-            with open(local_file, "rb") as f:
-                image_data = base64.b64encode(f.read())
+            # Read the data from s3 and encode it in memory (no /tmp round-trip)
+            response = get_s3_client().get_object(Bucket=bucket, Key=s3_key)
+            image_data = base64.b64encode(response['Body'].read())
             
             return {
                 "success": True,
                 "s3_key": s3_key,
-                "image_data": image_data.decode('utf-8'),
+                "image_data": image_data.decode('ascii'),
                 "s3_bucket": bucket
             }
         except Exception as e:
@@ -57,15 +133,16 @@ def lambda_handler(event, context):
             }
     
     # Process images in parallel
-    serialized_images = []
-    max_workers = min(len(s3_keys), 10)  # Limit concurrent downloads
-    
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        future_to_key = {executor.submit(serialize_single_image, key): key for key in s3_keys}
-        
-        for future in as_completed(future_to_key):
-            result = future.result()
-            serialized_images.append(result)
+    if len(s3_keys) == 1:
+        # Nothing to parallelize, so skip the event loop / thread pool setup
+        serialized_images = [serialize_single_image(s3_keys[0])]
+    elif get_aio_session() is not None:
+        import asyncio
+        serialized_images = asyncio.run(serialize_images_async(get_aio_session(), bucket, s3_keys))
+    else:
+        # serialize_single_image never raises, so map() yields every result
+        executor = get_thread_pool()  # Limits concurrent downloads to MAX_CONCURRENT_DOWNLOADS
+        serialized_images = list(executor.map(serialize_single_image, s3_keys))
     
     # Separate successful and failed serializations
     successful_images = [img for img in serialized_images if img['success']]
@@ -93,26 +170,111 @@ Description: Processes multiple images in parallel using SageMaker endpoint
 Handler: lambda_function.lambda_handler
 """
 
+import os
 import json
 import boto3
 import base64
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import atexit
+import struct
+from botocore.exceptions import BotoCoreError, ClientError
+from concurrent.futures import ThreadPoolExecutor
+
+ENDPOINT = os.environ.get('SM_ENDPOINT', "image-classification-2025-08-21-23-57-05-598")
+
+# Created once per container and reused by warm invocations; the pool
+# limits concurrent SageMaker calls to 5
+runtime = boto3.client('sagemaker-runtime')
+_SM_POOL = ThreadPoolExecutor(max_workers=5, thread_name_prefix='sm-invoke')
+atexit.register(_SM_POOL.shutdown)
+
+# MXNet RecordIO framing: magic, length word, then an IRHeader
+# (flag, label, id, id2) ahead of each encoded image
+_RECORDIO_MAGIC = struct.pack('<I', 0xced7230a)
+_IR_HEADER = struct.Struct('<IfQQ')
+
+# Flipped off the first time the endpoint says it can't read a batched
+# request, so warm containers go straight to per-image calls afterwards
+_batch_supported = True
+
+# Error codes for a busy or briefly unavailable endpoint. These are raised
+# rather than retried image by image, which would only add load; the state
+# machine retries the whole step with backoff instead
+_ENDPOINT_BUSY_ERRORS = ('ThrottlingException', 'ServiceUnavailable', 'InternalFailure')
+
+class EndpointBusyError(Exception):
+    """The endpoint throttled or failed transiently; retry the step later"""
+
+def build_recordio_batch(images):
+    """Pack decoded images into one RecordIO payload"""
+    parts = []
+    for i, image_bytes in enumerate(images):
+        record = _IR_HEADER.pack(0, 0.0, i, 0) + image_bytes
+        parts.append(_RECORDIO_MAGIC)
+        parts.append(struct.pack('<I', len(record)))
+        parts.append(record)
+        parts.append(b'\x00' * (-len(record) % 4))
+    return b''.join(parts)
+
+def classify_batch(decoded_images):
+    """Classify (image_data, image_bytes) pairs with a single endpoint invocation
+
+    Returns None when the images should be classified one by one instead:
+    either the endpoint can't read RecordIO batches at all (which also turns
+    batching off for this container) or it rejected this particular payload,
+    e.g. because one image is bad. Throttling and other transient failures
+    raise EndpointBusyError.
+    """
+    global _batch_supported
+    try:
+        response = runtime.invoke_endpoint(
+            EndpointName=ENDPOINT,
+            ContentType='application/x-recordio',
+            Body=build_recordio_batch([image_bytes for _, image_bytes in decoded_images])
+        )
+        predictions = json.loads(response['Body'].read())
+    except ClientError as e:
+        code = e.response.get('Error', {}).get('Code')
+        status = e.response.get('ResponseMetadata', {}).get('HTTPStatusCode', 0)
+        if code in _ENDPOINT_BUSY_ERRORS or status == 429 or status >= 500:
+            raise EndpointBusyError(str(e)) from e
+        # The model container reports an unreadable content type as 415
+        if status == 415 or e.response.get('OriginalStatusCode') == 415:
+            _batch_supported = False
+        return None
+    except (BotoCoreError, ConnectionError) as e:
+        raise EndpointBusyError(str(e)) from e
+    except ValueError:
+        # The endpoint answered, but not with JSON for a batch
+        _batch_supported = False
+        return None
+    
+    if (not isinstance(predictions, list) or len(predictions) != len(decoded_images)
+            or not all(isinstance(p, list) for p in predictions)):
+        _batch_supported = False
+        return None
+    
+    return [
+        {
+            "success": True,
+            "s3_key": image_data['s3_key'],
+            "s3_bucket": image_data['s3_bucket'],
+            "image_data": image_data['image_data'],
+            # Same JSON string the per-image path passes on
+            "inferences": json.dumps(inferences)
+        }
+        for (image_data, _), inferences in zip(decoded_images, predictions)
+    ]
 
 def lambda_handler(event, context):
     """Classify multiple images in parallel"""
     
-    runtime = boto3.client('sagemaker-runtime')
-    ENDPOINT = "image-classification-2025-08-21-23-57-05-598"
-    
     # Extract serialized images from previous step
     serialized_images = event['body']['serialized_images']
     
-    def classify_single_image(image_data):
+    def classify_single_image(decoded_image):
         """Classify a single image"""
+        image_data, image_bytes = decoded_image
         try:
-            # Decode the image data
-            image_bytes = base64.b64decode(image_data['image_data'])
-            
             # Make prediction using SageMaker runtime
             response = runtime.invoke_endpoint(
                 EndpointName=ENDPOINT,
@@ -140,16 +302,29 @@ def lambda_handler(event, context):
                 "error": str(e)
             }
     
-    # Process classifications in parallel
+    # Decode every image once, for whichever path classifies it
+    decoded_images = []
     classification_results = []
-    max_workers = min(len(serialized_images), 5)  # Limit concurrent SageMaker calls
+    for image_data in serialized_images:
+        try:
+            decoded_images.append((image_data, base64.b64decode(image_data['image_data'])))
+        except ValueError as e:
+            classification_results.append({
+                "success": False,
+                "s3_key": image_data['s3_key'],
+                "s3_bucket": image_data['s3_bucket'],
+                "error": str(e)
+            })
     
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        future_to_image = {executor.submit(classify_single_image, img): img for img in serialized_images}
-        
-        for future in as_completed(future_to_image):
-            result = future.result()
-            classification_results.append(result)
+    # Try one batched invocation first, then fall back to per-image calls
+    batch_results = None
+    if _batch_supported and len(decoded_images) > 1:
+        batch_results = classify_batch(decoded_images)
+    
+    if batch_results is None:
+        # classify_single_image never raises, so map() yields every result
+        batch_results = _SM_POOL.map(classify_single_image, decoded_images)
+    classification_results.extend(batch_results)
     
     # Separate successful and failed classifications
     successful_classifications = [result for result in classification_results if result['success']]
@@ -178,9 +353,26 @@ Handler: lambda_function.lambda_handler
 """
 
 import json
+import re
 
 THRESHOLD = 0.93
 
+# Error message templates, only formatted when the exception is actually raised
+_ERR_ALL_BELOW_THRESHOLD = "ALL_PREDICTIONS_BELOW_THRESHOLD: {} predictions below {} confidence"
+_ERR_HIGH_ERROR_RATE = "HIGH_ERROR_RATE: {} errors out of {} total"
+
+# Matches each number in a flat JSON list such as "[0.998, 0.001]"
+_NUMBER_RE = re.compile(r'[-+0-9.eE]+')
+
+def parse_inferences(raw_inferences):
+    """Parse the endpoint's flat list of probabilities without a full JSON parse"""
+    stripped = raw_inferences.strip()
+    if stripped.startswith('[') and stripped.endswith(']'):
+        return [float(value) for value in _NUMBER_RE.findall(stripped)]
+    
+    # Anything other than a flat list goes through the real parser
+    return json.loads(raw_inferences)
+
 def lambda_handler(event, context):
     """Filter multiple inferences based on confidence threshold"""
     
@@ -195,11 +387,15 @@ def lambda_handler(event, context):
     for classification in classifications:
         try:
             # Parse the inferences
-            inferences = json.loads(classification['inferences'])
-            max_confidence = max(inferences)
+            inferences = parse_inferences(classification['inferences'])
             
-            # Determine predicted class
-            predicted_class = 0 if inferences[0] > inferences[1] else 1
+            # Determine predicted class and its confidence with a single
+            # compare (the binary model always returns two probabilities)
+            bicycle_score, motorcycle_score = inferences
+            if bicycle_score > motorcycle_score:
+                predicted_class, max_confidence = 0, bicycle_score
+            else:
+                predicted_class, max_confidence = 1, motorcycle_score
             class_names = ['bicycle', 'motorcycle']
             
             result = {
@@ -263,9 +459,9 @@ def lambda_handler(event, context):
     
     # Raise error if all predictions are low confidence (for Step Functions error handling)
     if overall_status == "ALL_LOW_CONFIDENCE":
-        raise Exception(f"ALL_PREDICTIONS_BELOW_THRESHOLD: {low_confidence_count} predictions below {THRESHOLD} confidence")
+        raise Exception(_ERR_ALL_BELOW_THRESHOLD.format(low_confidence_count, THRESHOLD))
     elif overall_status == "HIGH_ERROR_RATE":
-        raise Exception(f"HIGH_ERROR_RATE: {error_count} errors out of {total_processed} total")
+        raise Exception(_ERR_HIGH_ERROR_RATE.format(error_count, total_processed))
     elif overall_status == "NO_VALID_PREDICTIONS":
         raise Exception("NO_VALID_PREDICTIONS: No successful predictions generated")
     
@@ -329,6 +525,14 @@ PARALLEL_STEP_FUNCTION_DEFINITION = {
                 "FunctionName": "ParallelImageClassification:$LATEST",
                 "Payload.$": "$.Payload"
             },
+            "Retry": [
+                {
+                    "ErrorEquals": ["EndpointBusyError"],
+                    "IntervalSeconds": 2,
+                    "MaxAttempts": 3,
+                    "BackoffRate": 2
+                }
+            ],
             "Next": "BatchFilterConfidence"
         },
         "BatchFilterConfidence": {
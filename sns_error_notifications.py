@@ -4,8 +4,13 @@ SNS Error Notification System for Scones Unlimited ML Workflow
 Implements error handling and alerting for Step Function failures
 """
 
+import os
 import json
+import time
+import random
 import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError
 from datetime import datetime
 import uuid
 
@@ -20,42 +25,9 @@ Handler: lambda_function.lambda_handler
 Trigger: EventBridge rule for Step Function state changes
 """
 
-def lambda_handler(event, context):
-    """Handle Step Function error notifications"""
-    
-    sns = boto3.client('sns')
-    
-    # SNS Topic ARN for error notifications
-    SNS_TOPIC_ARN = "arn:aws:sns:us-east-1:135808922609:scones-unlimited-ml-errors"
-    
-    # Extract Step Function execution details from EventBridge event
-    detail = event.get('detail', {})
-    
-    execution_arn = detail.get('executionArn', 'Unknown')
-    state_machine_arn = detail.get('stateMachineArn', 'Unknown')
-    status = detail.get('status', 'Unknown')
-    
-    # Only process failed executions
-    if status not in ['FAILED', 'TIMED_OUT', 'ABORTED']:
-        return {
-            'statusCode': 200,
-            'body': json.dumps('Not an error status, skipping notification')
-        }
-    
-    # Get execution name from ARN
-    execution_name = execution_arn.split(':')[-1] if execution_arn != 'Unknown' else 'Unknown'
-    state_machine_name = state_machine_arn.split(':')[-1] if state_machine_arn != 'Unknown' else 'Unknown'
-    
-    # Get additional details if available
-    start_date = detail.get('startDate', 'Unknown')
-    stop_date = detail.get('stopDate', 'Unknown')
-    error = detail.get('error', 'No error details available')
-    cause = detail.get('cause', 'No cause details available')
-    
-    # Format the error notification
-    subject = f"🚨 Scones Unlimited ML Workflow Error - {state_machine_name}"
-    
-    message = f"""
+# Alert body, built once per container; only the execution details are
+# filled in per notification
+_MESSAGE_TEMPLATE = """
 🛵 SCONES UNLIMITED - ML WORKFLOW ALERT 🛵
 
 ❌ Step Function Execution Failed
@@ -95,57 +67,248 @@ def lambda_handler(event, context):
    • Operations team should implement fallback procedures
 
 This is an automated alert from the Scones Unlimited ML monitoring system.
-Time: {datetime.utcnow().isoformat()}Z
-Incident ID: {str(uuid.uuid4())[:8]}
+Time: {timestamp}Z
+Incident ID: {incident_id}
     """
+
+# SNS Topic ARN for error notifications
+SNS_TOPIC_ARN = "arn:aws:sns:us-east-1:135808922609:scones-unlimited-ml-errors"
+
+# Created on first use and reused by warm invocations, so importing this
+# module (e.g. to run the setup helpers) doesn't require a configured region.
+# botocore's own retries are off because publish_with_backoff does the
+# retrying; short timeouts keep a hung call well inside the Lambda timeout.
+sns = None
+
+def get_sns_client():
+    """Return the container's shared SNS client"""
+    global sns
+    if sns is None:
+        sns = boto3.client('sns', config=Config(
+            retries={'total_max_attempts': 1},
+            connect_timeout=2,
+            read_timeout=5
+        ))
+    return sns
+
+# Execution statuses that trigger a notification
+ERROR_STATUSES = frozenset(['FAILED', 'TIMED_OUT', 'ABORTED'])
+
+# PublishBatch accepts at most 10 entries and 256 KiB of payload per request
+SNS_BATCH_SIZE = 10
+SNS_BATCH_MAX_BYTES = 256 * 1024
+
+# Long failure causes are cut so a single alert stays well inside the limit
+MAX_CAUSE_CHARS = 32 * 1024
+
+# Transient SNS errors are retried with exponential backoff (1s, 2s, capped
+# at 8s) plus jitter; the jitter source is seeded from os.urandom so
+# containers started together don't retry in lockstep
+SNS_MAX_ATTEMPTS = 3
+SNS_MAX_BACKOFF = 8
+_RETRYABLE_ERRORS = ('Throttling', 'Throttled', 'InternalError', 'InternalFailure', 'ServiceUnavailable')
+_JITTER = random.Random(os.urandom(16))
+
+_MESSAGE_ATTRIBUTES = {
+    'AlertType': {
+        'DataType': 'String',
+        'StringValue': 'StepFunctionFailure'
+    },
+    'Severity': {
+        'DataType': 'String', 
+        'StringValue': 'HIGH'
+    },
+    'Service': {
+        'DataType': 'String',
+        'StringValue': 'SconesUnlimited-ML'
+    }
+}
+
+def _entry_size(entry):
+    """Bytes a PublishBatch entry counts towards the request payload limit"""
+    size = len(entry['Message'].encode('utf-8')) + len(entry['Subject'].encode('utf-8'))
+    for name, attribute in entry['MessageAttributes'].items():
+        size += len(name) + len(attribute['DataType']) + len(attribute['StringValue'].encode('utf-8'))
+    return size
+
+def build_notification(detail):
+    """Return (execution name, PublishBatch entry) for one execution, or None if it didn't fail"""
     
-    try:
-        # Send SNS notification
-        response = sns.publish(
-            TopicArn=SNS_TOPIC_ARN,
-            Subject=subject,
-            Message=message,
-            MessageAttributes={
-                'AlertType': {
-                    'DataType': 'String',
-                    'StringValue': 'StepFunctionFailure'
-                },
-                'Severity': {
-                    'DataType': 'String', 
-                    'StringValue': 'HIGH'
-                },
-                'Service': {
-                    'DataType': 'String',
-                    'StringValue': 'SconesUnlimited-ML'
-                }
-            }
-        )
-        
+    # Only process failed executions; checked before anything else is read
+    status = detail.get('status', 'Unknown')
+    if status not in ERROR_STATUSES:
+        return None
+    
+    execution_arn = detail.get('executionArn', 'Unknown')
+    state_machine_arn = detail.get('stateMachineArn', 'Unknown')
+    
+    # Get execution name from ARN
+    execution_name = execution_arn.split(':')[-1] if execution_arn != 'Unknown' else 'Unknown'
+    state_machine_name = state_machine_arn.split(':')[-1] if state_machine_arn != 'Unknown' else 'Unknown'
+    
+    # Get additional details if available
+    start_date = detail.get('startDate', 'Unknown')
+    stop_date = detail.get('stopDate', 'Unknown')
+    error = detail.get('error', 'No error details available')
+    cause = detail.get('cause', 'No cause details available')
+    if len(cause) > MAX_CAUSE_CHARS:
+        cause = cause[:MAX_CAUSE_CHARS] + '... (truncated)'
+    
+    # Format the error notification
+    subject = f"🚨 Scones Unlimited ML Workflow Error - {state_machine_name}"
+    
+    message = _MESSAGE_TEMPLATE.format(
+        state_machine_name=state_machine_name,
+        execution_name=execution_name,
+        status=status,
+        start_date=start_date,
+        stop_date=stop_date,
+        error=error,
+        cause=cause,
+        execution_arn=execution_arn,
+        state_machine_arn=state_machine_arn,
+        timestamp=datetime.utcnow().isoformat(),
+        incident_id=str(uuid.uuid4())[:8]
+    )
+    
+    return execution_name, {
+        'Subject': subject,
+        'Message': message,
+        'MessageAttributes': _MESSAGE_ATTRIBUTES
+    }
+
+def publish_with_backoff(batch):
+    """Call publish_batch, retrying throttling and internal errors"""
+    
+    for attempt in range(SNS_MAX_ATTEMPTS):
+        try:
+            return get_sns_client().publish_batch(
+                TopicArn=SNS_TOPIC_ARN,
+                PublishBatchRequestEntries=batch
+            )
+        except ClientError as e:
+            if (e.response['Error']['Code'] not in _RETRYABLE_ERRORS
+                    or attempt == SNS_MAX_ATTEMPTS - 1):
+                raise
+            time.sleep(min(SNS_MAX_BACKOFF, 2 ** attempt) + _JITTER.uniform(0, 1))
+
+def publish_notifications(entries):
+    """Publish entries with PublishBatch, returning (successful, failed Ids)
+
+    Each entry's Id is its index in entries, so failures map straight back
+    to their source. Batches are cut at 10 entries or at the aggregate
+    payload limit, whichever comes first.
+    """
+    
+    successful = []
+    failed_ids = []
+    
+    def send(batch):
+        try:
+            response = publish_with_backoff(batch)
+        except Exception as e:
+            print(f"Failed to send SNS notification batch: {str(e)}")
+            failed_ids.extend(entry['Id'] for entry in batch)
+            return
+        successful.extend(response.get('Successful', []))
+        for failure in response.get('Failed', []):
+            print(f"Failed to send SNS notification {failure['Id']}: {failure.get('Message', failure.get('Code'))}")
+            failed_ids.append(failure['Id'])
+    
+    batch = []
+    batch_bytes = 0
+    for i, entry in enumerate(entries):
+        entry['Id'] = str(i)
+        entry_bytes = _entry_size(entry)
+        if batch and (len(batch) == SNS_BATCH_SIZE or batch_bytes + entry_bytes > SNS_BATCH_MAX_BYTES):
+            send(batch)
+            batch = []
+            batch_bytes = 0
+        batch.append(entry)
+        batch_bytes += entry_bytes
+    if batch:
+        send(batch)
+    
+    return successful, failed_ids
+
+def lambda_handler(event, context):
+    """Handle Step Function error notifications
+    
+    Accepts a single EventBridge event, or a batch of them delivered through
+    the SQS queue in SNS_CLOUDFORMATION_TEMPLATE so a burst of failures is
+    sent with one SNS request per 10. For SQS batches, records whose
+    notification could not be sent are reported back as batchItemFailures
+    so SQS redelivers them.
+    """
+    
+    # Extract Step Function execution details from the EventBridge event(s),
+    # keeping the SQS message id of each so failures can be reported
+    if 'Records' in event:
+        sources = [(record['messageId'], json.loads(record['body']).get('detail', {}))
+                   for record in event['Records']]
+    else:
+        sources = [(None, event.get('detail', {}))]
+    
+    notifications = []
+    for message_id, detail in sources:
+        notification = build_notification(detail)
+        if notification:
+            notifications.append((message_id,) + notification)
+    
+    if not notifications:
+        if 'Records' in event:
+            return {'batchItemFailures': []}
         return {
             'statusCode': 200,
-            'body': json.dumps({
-                'message': 'Error notification sent successfully',
-                'messageId': response['MessageId'],
-                'execution': execution_name,
-                'status': status
-            })
+            'body': json.dumps('Not an error status, skipping notification')
         }
-        
-    except Exception as e:
-        print(f"Failed to send SNS notification: {str(e)}")
+    
+    # Send SNS notifications
+    successful, failed_ids = publish_notifications([entry for _, _, entry in notifications])
+    
+    if 'Records' in event:
+        return {
+            'batchItemFailures': [
+                {'itemIdentifier': notifications[int(entry_id)][0]} for entry_id in failed_ids
+            ]
+        }
+    
+    if failed_ids:
         return {
             'statusCode': 500,
             'body': json.dumps({
                 'error': 'Failed to send notification',
-                'details': str(e)
+                'execution': notifications[0][1]
             })
         }
+    
+    return {
+        'statusCode': 200,
+        'body': json.dumps({
+            'message': 'Error notification sent successfully',
+            'messageId': successful[0]['MessageId'],
+            'execution': notifications[0][1],
+            'status': sources[0][1].get('status')
+        })
+    }
 
 
 # =============================================================================
 # CloudFormation Template for SNS Setup
 # =============================================================================
 
+# EventBridge pattern for failed Step Function executions, shared by the
+# template and setup_sns_notifications (serialized once for put_rule)
+EVENT_PATTERN = {
+    "source": ["aws.states"],
+    "detail-type": ["Step Functions Execution Status Change"],
+    "detail": {
+        "status": ["FAILED", "TIMED_OUT", "ABORTED"],
+        "stateMachineArn": [{"wildcard": "*ImageClassStateMachine*"}]
+    }
+}
+_EVENT_PATTERN_JSON = json.dumps(EVENT_PATTERN)
+
 SNS_CLOUDFORMATION_TEMPLATE = {
     "AWSTemplateFormatVersion": "2010-09-09",
     "Description": "SNS Error Notification Setup for Scones Unlimited ML Workflow",
@@ -182,33 +345,67 @@ SNS_CLOUDFORMATION_TEMPLATE = {
             "Properties": {
                 "Name": "scones-ml-stepfunction-errors",
                 "Description": "Capture Step Function failures for Scones Unlimited ML workflow",
-                "EventPattern": {
-                    "source": ["aws.states"],
-                    "detail-type": ["Step Functions Execution Status Change"],
-                    "detail": {
-                        "status": ["FAILED", "TIMED_OUT", "ABORTED"],
-                        "stateMachineArn": [
-                            {"wildcard": "*ImageClassStateMachine*"}
-                        ]
-                    }
-                },
+                "EventPattern": EVENT_PATTERN,
                 "State": "ENABLED",
                 "Targets": [
                     {
-                        "Id": "ErrorHandlerLambda",
+                        "Id": "ErrorEventQueue",
                         "Arn": {
-                            "Fn::GetAtt": ["ErrorHandlerFunction", "Arn"]
+                            "Fn::GetAtt": ["ErrorEventQueue", "Arn"]
                         }
                     }
                 ]
             }
         },
+        "ErrorEventQueue": {
+            "Type": "AWS::SQS::Queue",
+            "Properties": {
+                "QueueName": "scones-ml-stepfunction-errors",
+                "VisibilityTimeout": 180
+            }
+        },
+        "ErrorEventQueuePolicy": {
+            "Type": "AWS::SQS::QueuePolicy",
+            "Properties": {
+                "Queues": [{"Ref": "ErrorEventQueue"}],
+                "PolicyDocument": {
+                    "Version": "2012-10-17",
+                    "Statement": [
+                        {
+                            "Effect": "Allow",
+                            "Principal": {"Service": "events.amazonaws.com"},
+                            "Action": "sqs:SendMessage",
+                            "Resource": {"Fn::GetAtt": ["ErrorEventQueue", "Arn"]},
+                            "Condition": {
+                                "ArnEquals": {
+                                    "aws:SourceArn": {"Fn::GetAtt": ["StepFunctionErrorRule", "Arn"]}
+                                }
+                            }
+                        }
+                    ]
+                }
+            }
+        },
+        "ErrorEventSourceMapping": {
+            "Type": "AWS::Lambda::EventSourceMapping",
+            "Properties": {
+                "EventSourceArn": {"Fn::GetAtt": ["ErrorEventQueue", "Arn"]},
+                "FunctionName": {"Ref": "ErrorHandlerFunction"},
+                "BatchSize": 10,
+                "MaximumBatchingWindowInSeconds": 5,
+                "FunctionResponseTypes": ["ReportBatchItemFailures"]
+            }
+        },
         "ErrorHandlerFunction": {
             "Type": "AWS::Lambda::Function",
             "Properties": {
                 "FunctionName": "StepFunctionErrorHandler",
                 "Runtime": "python3.8",
                 "Handler": "lambda_function.lambda_handler",
+                # Covers two PublishBatch requests that each exhaust
+                # publish_with_backoff (about 5 s of sleeps plus the calls);
+                # the queue's visibility timeout is six times this
+                "Timeout": 30,
                 "Code": {
                     "ZipFile": "# Error handler code would be uploaded separately"
                 },
@@ -249,18 +446,26 @@ SNS_CLOUDFORMATION_TEMPLATE = {
                                 }
                             ]
                         }
+                    },
+                    {
+                        "PolicyName": "ErrorEventQueuePolicy",
+                        "PolicyDocument": {
+                            "Version": "2012-10-17",
+                            "Statement": [
+                                {
+                                    "Effect": "Allow",
+                                    "Action": [
+                                        "sqs:ReceiveMessage",
+                                        "sqs:DeleteMessage",
+                                        "sqs:GetQueueAttributes"
+                                    ],
+                                    "Resource": {"Fn::GetAtt": ["ErrorEventQueue", "Arn"]}
+                                }
+                            ]
+                        }
                     }
                 ]
             }
-        },
-        "LambdaInvokePermission": {
-            "Type": "AWS::Lambda::Permission",
-            "Properties": {
-                "Action": "lambda:InvokeFunction",
-                "FunctionName": {"Ref": "ErrorHandlerFunction"},
-                "Principal": "events.amazonaws.com",
-                "SourceArn": {"Fn::GetAtt": ["StepFunctionErrorRule", "Arn"]}
-            }
         }
     },
     "Outputs": {
@@ -271,6 +476,10 @@ SNS_CLOUDFORMATION_TEMPLATE = {
         "EventRuleArn": {
             "Description": "ARN of the EventBridge rule",
             "Value": {"Fn::GetAtt": ["StepFunctionErrorRule", "Arn"]}
+        },
+        "ErrorEventQueueArn": {
+            "Description": "ARN of the SQS queue that batches failure events for the handler",
+            "Value": {"Fn::GetAtt": ["ErrorEventQueue", "Arn"]}
         }
     }
 }
@@ -286,12 +495,56 @@ Description: Sends formatted error notifications to Slack
 Handler: lambda_function.lambda_handler
 """
 
+import urllib3
+from urllib3.util.retry import Retry
+
+# orjson decodes the SNS payload and encodes the Slack body several times
+# faster than the standard library, and its dumps already returns the
+# bytes urllib3 sends; fall back to json if the layer is missing
+try:
+    import orjson
+    json_loads = orjson.loads
+    json_dumps_bytes = orjson.dumps
+except ImportError:
+    json_loads = json.loads
+
+    def json_dumps_bytes(obj):
+        return json.dumps(obj).encode('utf-8')
+
+# Kept for the life of the container so warm invocations reuse the
+# connection to Slack instead of opening a new TLS session each time.
+# Webhook POSTs are only retried when Slack can't have posted the message:
+# a failed connect or a 429. A 5xx or read error may come after the message
+# went out, so those are not retried to avoid duplicate alerts. Retry-After
+# is ignored so a long rate-limit hint can't hold the Lambda past its
+# timeout; the backoff between attempts stays at 0s, 1s, 2s.
+http = urllib3.PoolManager(
+    num_pools=2,
+    maxsize=10,
+    block=False,
+    retries=Retry(
+        total=3,
+        read=0,
+        backoff_factor=0.5,
+        status_forcelist=[429],
+        allowed_methods=frozenset(['POST']),
+        respect_retry_after_header=False,
+        # Hand back the last response instead of raising MaxRetryError,
+        # so the handler still reports Slack's final status
+        raise_on_status=False
+    )
+)
+
+# Static parts of the Slack message; only the fields and timestamp change
+_SLACK_TEXT = "🚨 Scones Unlimited ML Workflow Alert"
+_SLACK_ATTACHMENT = {
+    "color": "danger",
+    "footer": "Scones Unlimited ML Monitoring"
+}
+
 def slack_lambda_handler(event, context):
     """Send Step Function errors to Slack"""
     
-    import urllib3
-    import json
-    
     # Slack webhook URL (store in environment variable or Parameter Store)
     SLACK_WEBHOOK_URL = os.environ.get('SLACK_WEBHOOK_URL')
     
@@ -302,20 +555,26 @@ def slack_lambda_handler(event, context):
         }
     
     # Parse SNS message
-    sns_message = json.loads(event['Records'][0]['Sns']['Message'])
+    sns_message = json_loads(event['Records'][0]['Sns']['Message'])
+    
+    # Extract execution details, skipping messages that carry none
+    detail = sns_message.get('detail')
+    if not detail:
+        return {
+            'statusCode': 200,
+            'body': json.dumps('No execution details, skipping notification')
+        }
     
-    # Extract execution details
-    detail = sns_message.get('detail', {})
     execution_name = detail.get('executionArn', 'Unknown').split(':')[-1]
     status = detail.get('status', 'Unknown')
     error = detail.get('error', 'No error details')
     
     # Format Slack message
     slack_message = {
-        "text": "🚨 Scones Unlimited ML Workflow Alert",
+        "text": _SLACK_TEXT,
         "attachments": [
             {
-                "color": "danger",
+                **_SLACK_ATTACHMENT,
                 "fields": [
                     {
                         "title": "Execution",
@@ -333,18 +592,16 @@ def slack_lambda_handler(event, context):
                         "short": False
                     }
                 ],
-                "footer": "Scones Unlimited ML Monitoring",
-                "ts": int(datetime.utcnow().timestamp())
+                "ts": int(time.time())
             }
         ]
     }
     
     # Send to Slack
-    http = urllib3.PoolManager()
     response = http.request(
         'POST',
         SLACK_WEBHOOK_URL,
-        body=json.dumps(slack_message),
+        body=json_dumps_bytes(slack_message),
         headers={'Content-Type': 'application/json'}
     )
     
@@ -378,14 +635,7 @@ def setup_sns_notifications():
     # Create EventBridge rule
     rule_response = events.put_rule(
         Name='scones-ml-stepfunction-errors',
-        EventPattern=json.dumps({
-            "source": ["aws.states"],
-            "detail-type": ["Step Functions Execution Status Change"],
-            "detail": {
-                "status": ["FAILED", "TIMED_OUT", "ABORTED"],
-                "stateMachineArn": [{"wildcard": "*ImageClassStateMachine*"}]
-            }
-        }),
+        EventPattern=_EVENT_PATTERN_JSON,
         State='ENABLED',
         Description='Capture Step Function failures for Scones ML workflow'
     )
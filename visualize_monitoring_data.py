@@ -2,56 +2,184 @@
 """
 Visualization script for SageMaker Model Monitor captured data
 """
+import os
 import json
+import mmap
+import re
+from array import array
+import numpy as np
 import matplotlib.pyplot as plt
-from datetime import datetime
 import matplotlib.dates as mdates
 
-def parse_captured_data(file_path):
-    """Parse the captured JSONL data"""
-    data = []
-    with open(file_path, 'r') as f:
-        for line in f:
-            if line.strip():
-                data.append(json.loads(line.strip()))
-    return data
+# orjson parses the capture records several times faster than the
+# standard library; fall back to json if it isn't installed
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
+
+# Matches the endpoint's two-probability output such as "[0.998, 0.002]"
+_PAIR_RE = re.compile(r'\[\s*([-+0-9.eE]+)\s*,\s*([-+0-9.eE]+)\s*\]')
+
+def parse_inference(output_data):
+    """Parse the endpoint output, using the regex fast path when it matches"""
+    match = _PAIR_RE.match(output_data)
+    if match:
+        return float(match.group(1)), float(match.group(2))
+    
+    # Anything else must still be a [bicycle, motorcycle] pair, otherwise the
+    # flat probability buffer would drift out of step with the timestamps
+    inference = json_loads(output_data)
+    if not isinstance(inference, list) or len(inference) != 2:
+        raise ValueError(f"Expected 2 class probabilities, got: {output_data!r}")
+    return float(inference[0]), float(inference[1])
+
+def parse_captured_data(file_path, start=0, end=None):
+    """Parse the captured JSONL data, yielding one record at a time
+
+    The file is memory-mapped so large captures are read straight from
+    the page cache rather than through a second userspace buffer. When a
+    byte range is given, only the lines that start inside it are parsed.
+    """
+    with open(file_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            size = len(mm)
+            end = size if end is None else min(end, size)
+            
+            # Skip ahead to the first line that starts at or after start
+            pos = start
+            if pos > 0:
+                newline = mm.find(b'\n', pos - 1)
+                pos = size if newline == -1 else newline + 1
+            
+            while pos < end:
+                newline = mm.find(b'\n', pos)
+                if newline == -1:
+                    newline = size
+                line = mm[pos:newline]
+                pos = newline + 1
+                if line.strip():
+                    yield json_loads(line)
 
 def extract_inference_data(data):
-    """Extract inference results and timestamps"""
-    timestamps = []
-    confidences = []
-    predictions = []
+    """Extract inference results and timestamps from an iterable of records"""
+    timestamp_strs = []
+    # Probabilities are packed into one flat buffer of doubles as they are
+    # read, rather than kept as a tuple of float objects per record
+    probability_buffer = array('d')
     
     for record in data:
         # Extract inference output
         output_data = record['captureData']['endpointOutput']['data']
-        inference = json.loads(output_data)
+        probability_buffer.extend(parse_inference(output_data))
         
-        # Extract timestamp
-        timestamp_str = record['eventMetadata']['inferenceTime']
-        timestamp = datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
-        
-        # Calculate confidence (max of the two probabilities)
-        max_confidence = max(inference)
-        
-        # Determine prediction (0=bicycle, 1=motorcycle)
-        prediction = 0 if inference[0] > inference[1] else 1
-        
-        timestamps.append(timestamp)
-        confidences.append(max_confidence)
-        predictions.append(prediction)
+        # Extract timestamp; inference times are UTC, so the Z suffix is
+        # dropped and the strings are parsed in one batch below
+        timestamp_strs.append(record['eventMetadata']['inferenceTime'].rstrip('Z'))
+    
+    timestamps = np.array(timestamp_strs, dtype='datetime64[us]')
+    
+    # One (N, 2) array of [bicycle, motorcycle] probabilities
+    probabilities = np.frombuffer(probability_buffer, dtype=np.float64).reshape(-1, 2)
+    
+    # Calculate confidence (max of the two probabilities)
+    confidences = probabilities.max(axis=1)
+    
+    # Determine prediction (0=bicycle, 1=motorcycle), ties go to motorcycle
+    predictions = (probabilities[:, 1] >= probabilities[:, 0]).astype(np.int8)
     
     return timestamps, confidences, predictions
 
-def create_visualizations(timestamps, confidences, predictions):
+# Below this size the capture file is parsed in-process; worker startup
+# would cost more than it saves
+PARALLEL_PARSE_MIN_BYTES = 8 * 1024 * 1024
+
+def _extract_range(args):
+    """Worker entry point: extract the records whose lines start in one byte range"""
+    file_path, start, end = args
+    return extract_inference_data(parse_captured_data(file_path, start, end))
+
+def extract_inference_data_parallel(file_path, processes=None):
+    """Parse and extract a capture file across processes, one byte range each"""
+    from multiprocessing import Pool
+    
+    processes = processes or os.cpu_count() or 1
+    size = os.path.getsize(file_path)
+    if processes == 1 or size < PARALLEL_PARSE_MIN_BYTES:
+        return extract_inference_data(parse_captured_data(file_path))
+    
+    bounds = np.linspace(0, size, processes + 1).astype(np.int64).tolist()
+    ranges = [(file_path, bounds[i], bounds[i + 1]) for i in range(processes)]
+    
+    # imap keeps the chunks in file order
+    with Pool(processes) as pool:
+        chunks = list(pool.imap(_extract_range, ranges))
+    
+    timestamps, confidences, predictions = zip(*chunks)
+    return np.concatenate(timestamps), np.concatenate(confidences), np.concatenate(predictions)
+
+# RGBA lookup tables for the scatter plots, indexed by a 0/1 array so
+# matplotlib doesn't parse a color name per point
+CONFIDENCE_COLORS = np.array([[1.0, 0.0, 0.0, 0.7],    # red: below threshold
+                              [0.0, 0.0, 1.0, 0.7]])   # blue: at or above threshold
+PREDICTION_COLORS = np.array([[0.0, 128 / 255, 0.0, 0.7],    # green: bicycle
+                              [1.0, 165 / 255, 0.0, 0.7]])   # orange: motorcycle
+
+# Above this many inferences the plots show per-time-bucket aggregates
+# instead of one point per inference
+MAX_PLOT_POINTS = 5000
+
+def downsample_time_series(timestamps, confidences, predictions, max_points=MAX_PLOT_POINTS):
+    """Bucket the series by time into at most max_points buckets
+
+    Returns the bucket centre times, the mean/min/max confidence and the
+    majority prediction of each non-empty bucket.
+    """
+    epoch = timestamps.astype('datetime64[us]').astype(np.int64) / 1e6
+    start = epoch.min()
+    bucket_sec = max(1.0, np.ceil((epoch.max() - start) / max_points))
+    
+    buckets, inverse = np.unique(np.floor((epoch - start) / bucket_sec).astype(np.int64),
+                                 return_inverse=True)
+    counts = np.bincount(inverse)
+    
+    conf_mean = np.bincount(inverse, weights=confidences) / counts
+    conf_min = np.full(len(buckets), np.inf)
+    conf_max = np.full(len(buckets), -np.inf)
+    np.minimum.at(conf_min, inverse, confidences)
+    np.maximum.at(conf_max, inverse, confidences)
+    
+    motorcycle_share = np.bincount(inverse, weights=predictions) / counts
+    majority = (motorcycle_share >= 0.5).astype(np.int8)
+    
+    centres = start + (buckets + 0.5) * bucket_sec
+    bucket_times = (centres * 1e6).astype('datetime64[us]')
+    return bucket_times, conf_mean, conf_min, conf_max, majority
+
+def create_visualizations(timestamps, confidences, predictions, show=False):
     """Create visualizations of the monitoring data"""
     
-    # Create figure with subplots
-    fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(12, 10))
+    # Create figure with subplots; constrained layout is resolved while
+    # drawing, so saving doesn't need a separate tight-bbox render pass
+    fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(12, 10), constrained_layout=True)
+    
+    downsampled = len(confidences) > MAX_PLOT_POINTS
+    if downsampled:
+        plot_times, plot_confidences, conf_min, conf_max, plot_predictions = \
+            downsample_time_series(timestamps, confidences, predictions)
+        ax1.fill_between(plot_times, conf_min, conf_max, color='gray', alpha=0.3,
+                         label='Bucket min/max')
+        time_locator = mdates.AutoDateLocator()
+    else:
+        plot_times, plot_confidences, plot_predictions = timestamps, confidences, predictions
+        time_locator = mdates.SecondLocator(interval=10)
     
     # Plot 1: Confidence levels over time
-    colors = ['red' if conf < 0.93 else 'blue' for conf in confidences]
-    ax1.scatter(timestamps, confidences, c=colors, alpha=0.7, s=50)
+    colors = CONFIDENCE_COLORS[(plot_confidences >= 0.93).astype(np.intp)]
+    ax1.scatter(plot_times, plot_confidences, c=colors, s=50)
     ax1.axhline(y=0.93, color='green', linestyle='--', linewidth=2, 
                 label='Confidence Threshold (93%)')
     ax1.set_ylabel('Confidence Level')
@@ -62,14 +190,14 @@ def create_visualizations(timestamps, confidences, predictions):
     
     # Format x-axis for time
     ax1.xaxis.set_major_formatter(mdates.DateFormatter('%H:%M:%S'))
-    ax1.xaxis.set_major_locator(mdates.SecondLocator(interval=10))
+    ax1.xaxis.set_major_locator(time_locator)
     plt.setp(ax1.xaxis.get_majorticklabels(), rotation=45)
     
     # Plot 2: Predictions over time
     prediction_labels = ['Bicycle', 'Motorcycle']
-    pred_colors = ['green' if p == 0 else 'orange' for p in predictions]
+    pred_colors = PREDICTION_COLORS[plot_predictions]
     
-    ax2.scatter(timestamps, predictions, c=pred_colors, alpha=0.7, s=50)
+    ax2.scatter(plot_times, plot_predictions, c=pred_colors, s=50)
     ax2.set_ylabel('Prediction')
     ax2.set_xlabel('Time')
     ax2.set_title('Model Predictions Over Time')
@@ -79,34 +207,47 @@ def create_visualizations(timestamps, confidences, predictions):
     
     # Format x-axis for time
     ax2.xaxis.set_major_formatter(mdates.DateFormatter('%H:%M:%S'))
-    ax2.xaxis.set_major_locator(mdates.SecondLocator(interval=10))
+    ax2.xaxis.set_major_locator(time_locator)
     plt.setp(ax2.xaxis.get_majorticklabels(), rotation=45)
     
-    plt.tight_layout()
-    plt.savefig('model_monitoring_visualization.png', dpi=300, bbox_inches='tight')
-    plt.show()
+    plt.savefig('model_monitoring_visualization.png', dpi=150)
+    if show:
+        plt.show()
+    
+    # Print summary statistics (the below-threshold and bicycle counts are
+    # the complements, so each array is only reduced a few times)
+    total = len(confidences)
+    above_threshold = int(np.count_nonzero(confidences >= 0.93))
+    motorcycles = int(np.count_nonzero(predictions))
     
-    # Print summary statistics
     print("\n=== Model Monitoring Summary ===")
-    print(f"Total inferences captured: {len(confidences)}")
-    print(f"Average confidence: {sum(confidences)/len(confidences):.4f}")
-    print(f"Minimum confidence: {min(confidences):.4f}")
-    print(f"Maximum confidence: {max(confidences):.4f}")
-    print(f"Inferences above threshold (93%): {sum(1 for c in confidences if c >= 0.93)}")
-    print(f"Inferences below threshold (93%): {sum(1 for c in confidences if c < 0.93)}")
-    print(f"Bicycle predictions: {sum(1 for p in predictions if p == 0)}")
-    print(f"Motorcycle predictions: {sum(1 for p in predictions if p == 1)}")
+    print(f"Total inferences captured: {total}")
+    print(f"Average confidence: {confidences.mean():.4f}")
+    print(f"Minimum confidence: {confidences.min():.4f}")
+    print(f"Maximum confidence: {confidences.max():.4f}")
+    print(f"Inferences above threshold (93%): {above_threshold}")
+    print(f"Inferences below threshold (93%): {total - above_threshold}")
+    print(f"Bicycle predictions: {total - motorcycles}")
+    print(f"Motorcycle predictions: {motorcycles}")
 
 if __name__ == "__main__":
-    # Parse the captured data
-    print("Parsing captured monitoring data...")
-    data = parse_captured_data('captured_data.jsonl')
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='Visualize SageMaker Model Monitor captured data')
+    parser.add_argument('--interactive', action='store_true',
+                        help='Also open the plots in a window after saving the PNG')
+    args = parser.parse_args()
     
-    # Extract inference information
-    timestamps, confidences, predictions = extract_inference_data(data)
+    if not args.interactive:
+        # Only the PNG is needed, so skip initializing a GUI backend
+        plt.switch_backend('Agg')
+    
+    # Parse the captured data and extract inference information
+    print("Parsing captured monitoring data...")
+    timestamps, confidences, predictions = extract_inference_data_parallel('captured_data.jsonl')
     
     # Create visualizations
     print("Creating visualizations...")
-    create_visualizations(timestamps, confidences, predictions)
+    create_visualizations(timestamps, confidences, predictions, show=args.interactive)
     
     print("\nVisualization saved as 'model_monitoring_visualization.png'")
\ No newline at end of file